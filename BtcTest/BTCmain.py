@@ -1,23 +1,85 @@
-from utils import fetch_current_price, initialize_strategy, check_buy_conditions, check_stop_loss, place_order
+from utils import fetch_current_price, fetch_gap_klines, initialize_strategy, check_buy_conditions, check_stop_loss, place_order, load_exchange_info
+from binance_stream import BinanceStream
+from strategy_state import StrategyState, CHECKPOINT_FILE
 import time
 
 # 初始參數
 initial_capital = 1500
 num_positions = 30 #每一筆50USDT
 symbol = 'BTCUSDT'
+streaming = True  # True 時訂閱幣安 K 線串流，False 時每5秒以 REST 查詢價格
+kline_interval = '1m'
 
-strategy = initialize_strategy(initial_capital, num_positions)
+# 有檢查點時從上次的狀態繼續 (停損價格與持倉階梯)，否則重新開始
+strategy = StrategyState.load(CHECKPOINT_FILE)
+if strategy is None:
+    strategy = initialize_strategy(initial_capital, num_positions)
+else:
+    print(f"從檢查點恢復：持倉 {strategy.position_count} 筆，停損價格 {strategy.stop_loss_price}")
+load_exchange_info()
 
-while True:
-    current_price = fetch_current_price(symbol)
-    print(f"當前價格: {current_price}")
+# 最後一次進場 (停損價格隨之更新) 所在 K 線的開始時間，以及進場後在該 K 線內觀察到的最低價
+entry_bar = None
+entry_bar_low = None
+
+def stop_check_price(current_price, low_price=None, bar_start=None):
+    # K 線最低價是整根累計的，進場所在的那根可能包含進場前的低點，改用進場後觀察到的最低價
+    global entry_bar_low
+    if low_price is None:
+        return current_price
+    if bar_start != entry_bar:
+        return min(low_price, current_price)
+    entry_bar_low = min(entry_bar_low, current_price)
+    return entry_bar_low
 
-    if check_stop_loss(strategy, current_price):
+def on_stop_check(low_price):
+    # 以期間最低價檢查停損，返回 True 表示觸發停損，策略結束
+    if check_stop_loss(strategy, low_price):
+        strategy.checkpoint(CHECKPOINT_FILE)
         print("觸發動態停損，清倉結束。")
-        break
+        return True
+    return False
+
+def on_price(current_price, low_price=None, bar_start=None):
+    # 停損以最低價檢查 (K 線內的回落也會觸發)，加倉只以最新價格判斷
+    global entry_bar, entry_bar_low
+    print(f"當前價格: {current_price}")
+
+    if on_stop_check(stop_check_price(current_price, low_price, bar_start)):
+        return True
 
     if check_buy_conditions(strategy, current_price):
         print(f"價格 {current_price} 達到加倉條件，加倉。")
-        place_order(symbol, 'BUY', strategy['position_size'], current_price)
+        place_order(symbol, 'BUY', strategy.position_size, current_price)
+        entry_bar, entry_bar_low = bar_start, current_price
+    strategy.checkpoint(CHECKPOINT_FILE)  # 狀態沒有改變時不寫入
+    return False
+
+if streaming:
+    stream = BinanceStream([symbol], interval=kline_interval)
+    stream.start()
+    try:
+        while not stream.finished:
+            update = stream.get(timeout=30)
+            if update is None:
+                continue
+            if update['kind'] == 'gap':
+                # 斷線期間遺失的 K 線只用來檢查停損，不以過時的價格加倉
+                try:
+                    klines = fetch_gap_klines(symbol, kline_interval, update['start'], update['end'])
+                except Exception as e:
+                    print(f"補齊缺口 K 線失敗，繼續以串流監控停損：{e}")
+                    continue
+                if any(on_stop_check(stop_check_price(close, low, start)) for start, low, close in klines):
+                    break
+            elif on_price(update['price'], update.get('low'), update.get('start')):
+                break
+    finally:
+        stream.stop()
+else:
+    while True:
+        current_price = fetch_current_price(symbol)
+        if on_price(current_price):
+            break
 
-    time.sleep(5)  # 每5秒檢查一次
\ No newline at end of file
+        time.sleep(5)  # 每5秒檢查一次
@@ -1,119 +1,75 @@
-# import pandas as pd
-# from binance.client import Client
+import sys
+import time
 
-# # 初始化 Binance 客戶端
-# api_key = "test"
-# api_secret = "test"
-# client = Client(api_key, api_secret)
+import pandas as pd
+from binance.client import Client
 
-# # 獲取歷史 K 線數據
-# def fetch_binance_data(symbol='BTCUSDT', interval='15m', start_date='1 Jan 2023', end_date='31 Dec 2023'):
-#     klines = client.get_historical_klines(
-#         symbol=symbol,
-#         interval=interval,
-#         start_str=start_date,
-#         end_str=end_date
-#     )
+from candlestick_patterns import (EXIT_REASONS, PATTERNS, align_ohlc, backtest_pattern_entries, pattern_summary,
+                                  scan_patterns)
 
-#     # 將數據轉換為 DataFrame
-#     data = pd.DataFrame(klines, columns=[
-#         'timestamp', 'open', 'high', 'low', 'close', 'volume',
-#         'close_time', 'quote_asset_volume', 'number_of_trades',
-#         'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
-#     ])
-#     # 格式化數據
-#     data['datetime'] = pd.to_datetime(data['timestamp'], unit='ms')
-#     data['open'] = data['open'].astype(float)
-#     data['high'] = data['high'].astype(float)
-#     data['low'] = data['low'].astype(float)
-#     data['close'] = data['close'].astype(float)
-#     data['volume'] = data['volume'].astype(float)
-#     return data[['datetime', 'open', 'high', 'low', 'close', 'volume']]
+# 初始化 Binance 客戶端
+api_key = "test"
+api_secret = "test"
+client = Client(api_key, api_secret)
 
-# # 初始化策略
-# def initialize_strategy(capital, num_positions):
-#     position_size = capital / num_positions  # 固定每筆下單金額
-#     return {
-#         'capital': capital,
-#         'position_size': position_size,
-#         'positions': [],
-#         'btc_quantity': 0,
-#         'stop_loss_price': None,
-#         'initial_stop_loss_pct': 0.5,
-#         'target_gain_pct': 0.05,
-#         'num_positions': num_positions,
-#         'prices': [],  # 用於計算移動平均線
-#         'trade_log': []  # 記錄交易日誌
-#     }
+# 獲取歷史 K 線數據
+def fetch_binance_data(symbol='BTCUSDT', interval='15m', start_date='1 Jan 2023', end_date='31 Dec 2023'):
+    klines = client.get_historical_klines(
+        symbol=symbol,
+        interval=interval,
+        start_str=start_date,
+        end_str=end_date
+    )
 
-# # 更新移動平均線作為動態停損價格
-# def update_moving_average(strategy, window=10):
-#     if len(strategy['prices']) >= window:
-#         moving_average = sum(strategy['prices'][-window:]) / window
-#         strategy['stop_loss_price'] = moving_average
+    # 將數據轉換為 DataFrame
+    data = pd.DataFrame(klines, columns=[
+        'timestamp', 'open', 'high', 'low', 'close', 'volume',
+        'close_time', 'quote_asset_volume', 'number_of_trades',
+        'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
+    ])
+    # 格式化數據
+    data['datetime'] = pd.to_datetime(data['timestamp'], unit='ms')
+    data['open'] = data['open'].astype(float)
+    data['high'] = data['high'].astype(float)
+    data['low'] = data['low'].astype(float)
+    data['close'] = data['close'].astype(float)
+    data['volume'] = data['volume'].astype(float)
+    return data[['timestamp', 'datetime', 'open', 'high', 'low', 'close', 'volume']]
 
-# # 檢查是否符合加倉條件
-# def check_buy_conditions(strategy, current_price):
-#     if len(strategy['positions']) < strategy['num_positions'] and \
-#        (len(strategy['positions']) == 0 or current_price >= strategy['positions'][-1][0] * (1 + strategy['target_gain_pct'])):
-#         strategy['positions'].append((current_price, strategy['position_size']))
-#         strategy['btc_quantity'] += strategy['position_size'] / current_price
-#         strategy['prices'].append(current_price)
-#         update_moving_average(strategy)
-#         return True
-#     return False
+# 下載多個交易對的 K 線並依時間對齊成二維陣列 (每列一個交易對)
+def fetch_aligned_data(symbols, interval='15m', start_date='1 Jan 2023', end_date='31 Dec 2023'):
+    series = {}
+    for symbol in symbols:
+        data = fetch_binance_data(symbol, interval, start_date, end_date)
+        if len(data):
+            series[symbol] = (data['timestamp'].to_numpy(), data['open'].to_numpy(), data['high'].to_numpy(),
+                              data['low'].to_numpy(), data['close'].to_numpy())
+    return align_ohlc(series)
 
-# # 檢查是否觸發動態停損
-# def check_stop_loss(strategy, current_price):
-#     if current_price <= (strategy['stop_loss_price'] or 0):
-#         strategy['capital'] = strategy['btc_quantity'] * current_price
-#         strategy['trade_log'].append({
-#             'action': 'STOP_LOSS',
-#             'price': current_price,
-#             'capital': strategy['capital']
-#         })
-#         strategy['positions'].clear()
-#         strategy['btc_quantity'] = 0
-#         strategy['stop_loss_price'] = None
-#         strategy['prices'] = []
-#         return True
-#     return False
+# 回測邏輯：所有交易對一次掃描形態並回測，不逐列迭代
+def backtest_strategy(symbols, open_, high, low, close, pattern='hammer', stop_loss_pct=0.02, take_profit_pct=0.04,
+                      max_holding=96):
+    entries = scan_patterns(open_, high, low, close, patterns=(pattern,))[pattern]
+    trades = backtest_pattern_entries(high, low, close, entries, stop_loss_pct, take_profit_pct, max_holding)
+    return trades, pattern_summary(trades, symbols)
 
-# # 回測邏輯
-# def backtest_strategy(data, initial_capital=1500, num_positions=30):
-#     strategy = initialize_strategy(initial_capital, num_positions)
+if __name__ == "__main__":
+    # 用法: python backtest_hammer_strategy.py [形態] [交易對...]
+    pattern = sys.argv[1] if len(sys.argv) > 1 else 'hammer'
+    if pattern not in PATTERNS:
+        print(f"不支援的形態: {pattern}，可用形態: {', '.join(PATTERNS)}")
+        sys.exit(1)
+    symbols = sys.argv[2:] or ['BTCUSDT']
 
-#     for i, row in data.iterrows():
-#         current_price = row['close']
+    # 獲取數據並回測
+    symbols, times, open_, high, low, close = fetch_aligned_data(symbols)
+    start = time.perf_counter()
+    trades, summary = backtest_strategy(symbols, open_, high, low, close, pattern)
+    elapsed = time.perf_counter() - start
 
-#         # 檢查是否觸發動態停損
-#         if check_stop_loss(strategy, current_price):
-#             break
-
-#         # 檢查是否符合加倉條件
-#         if check_buy_conditions(strategy, current_price):
-#             strategy['trade_log'].append({
-#                 'action': 'BUY',
-#                 'price': current_price,
-#                 'btc_quantity': strategy['btc_quantity'],
-#                 'position_size': strategy['position_size']  # 每次固定下單金額
-#             })
-
-#     # 最終資金計算
-#     final_capital = strategy['capital'] + strategy['btc_quantity'] * data.iloc[-1]['close']
-#     strategy['trade_log'].append({
-#         'action': 'FINAL',
-#         'price': data.iloc[-1]['close'],
-#         'capital': final_capital
-#     })
-#     return strategy
-
-# # 獲取數據並回測
-# data = fetch_binance_data()
-# result = backtest_strategy(data)
-
-# # 顯示結果
-# print("最終資金餘額:", result['capital'])
-# print("交易日誌:")
-# for log in result['trade_log']:
-#     print(log)
+    # 顯示結果
+    print(pd.DataFrame(summary).sort_values('total_return', ascending=False).to_string(index=False))
+    reasons = pd.Series([EXIT_REASONS[r] for r in trades['reason']]).value_counts()
+    print("出場原因:")
+    print(reasons.to_string())
+    print(f"{len(symbols)} 個交易對、{close.shape[1]} 根 K 線，共 {len(trades)} 筆交易，掃描及回測耗時 {elapsed:.2f} 秒")
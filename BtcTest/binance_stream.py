@@ -0,0 +1,335 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+BINANCE_WS_URL = "wss://stream.binance.com:9443/stream"
+QUEUE_SIZE = 1000  # 待處理更新的上限，超過時丟棄最舊的一筆
+TICKER_GAP_MS = 5000  # ticker 每秒推送一次，兩筆間隔超過此毫秒數視為資料缺口
+
+_INTERVAL_UNIT_MS = {'m': 60000, 'h': 3600000, 'd': 86400000, 'w': 604800000}
+
+
+def interval_ms(interval):
+    """
+    將 K 線週期 (例如 '1m'、'4h'、'1d') 轉為毫秒。
+    """
+    unit = interval[-1:]
+    if unit not in _INTERVAL_UNIT_MS or not interval[:-1].isdigit():
+        raise ValueError(f"不支援的 K 線週期: {interval}")
+    return int(interval[:-1]) * _INTERVAL_UNIT_MS[unit]
+
+
+class WebSocketTransport:
+    """
+    預設的 websocket 傳輸層，使用 websocket-client 套件。
+    任何提供 connect(url) 並返回具備 recv()、close() 連線物件的類別都可以替換它，例如 ReplayTransport。
+    """
+
+    def __init__(self, timeout=30):
+        self.timeout = timeout
+
+    def connect(self, url):
+        try:
+            import websocket
+        except ImportError:
+            raise RuntimeError("串流模式需要安裝 websocket-client：pip install websocket-client")
+        return websocket.create_connection(url, timeout=self.timeout)
+
+
+class ReplayTransport:
+    """
+    重播錄製的 websocket 訊息 (每行一則)，作為本地的幣安 websocket 替身，不需要網路即可測試串流模式。
+    所有訊息送完後拋出 EOFError，串流隨之結束。
+    :param messages: 訊息字串列表，或 BinanceStream(record_path=...) 錄製的檔案路徑
+    :param disconnect_after: 每條連線送出多少則訊息後模擬斷線，None 表示不斷線
+    :param skip_on_reconnect: 重新連線時略過的訊息數，模擬斷線期間遺失的資料
+    :param delay: 每則訊息之間的間隔秒數
+    """
+
+    def __init__(self, messages, disconnect_after=None, skip_on_reconnect=0, delay=0.0):
+        if isinstance(messages, str):
+            with open(messages, "r") as f:
+                messages = [line.rstrip("\n") for line in f if line.strip()]
+        self.messages = list(messages)
+        self.disconnect_after = disconnect_after
+        self.skip_on_reconnect = skip_on_reconnect
+        self.delay = delay
+        self.position = 0
+        self.connections = 0
+
+    def connect(self, url):
+        if self.connections:
+            self.position += self.skip_on_reconnect
+        if self.position >= len(self.messages):
+            raise EOFError("重播資料已結束")
+        self.connections += 1
+        return _ReplayConnection(self)
+
+
+class _ReplayConnection:
+
+    def __init__(self, transport):
+        self.transport = transport
+        self.sent = 0
+        self.closed = False
+
+    def recv(self):
+        transport = self.transport
+        if transport.position >= len(transport.messages):
+            raise EOFError("重播資料已結束")
+        limit = transport.disconnect_after
+        if self.closed or (limit and self.sent >= limit):
+            return ""  # 模擬伺服器關閉連線
+        if transport.delay:
+            time.sleep(transport.delay)
+        message = transport.messages[transport.position]
+        transport.position += 1
+        self.sent += 1
+        return message
+
+    def send(self, text):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class ConflatingQueue:
+    """
+    有界的合併佇列。同一個 key 尚未被取走的更新會被新的更新取代並保留原本的排隊位置，
+    消費端處理較慢時只會拿到最新狀態，佇列長度不會無限增長；不同 key 超過 maxsize 時丟棄最舊的一筆。
+    """
+
+    def __init__(self, maxsize=QUEUE_SIZE):
+        self.maxsize = maxsize
+        self.conflated = 0
+        self.dropped = 0
+        self._items = OrderedDict()
+        self._cond = threading.Condition()
+        self._closed = False
+
+    def put(self, key, item):
+        with self._cond:
+            if self._closed:
+                return
+            if key in self._items:
+                self.conflated += 1
+            elif len(self._items) >= self.maxsize:
+                self._items.popitem(last=False)
+                self.dropped += 1
+            self._items[key] = item
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """
+        取出最早排隊的更新，逾時或佇列已關閉且清空時返回 None。
+        """
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._items or self._closed, timeout):
+                return None
+            if self._items:
+                return self._items.popitem(last=False)[1]
+            return None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def __len__(self):
+        return len(self._items)
+
+
+class BinanceStream:
+    """
+    幣安 K 線或 ticker 串流，於背景執行緒接收推送，整理成更新字典放入 ConflatingQueue，
+    由主執行緒以 get() 逐筆取出。連線中斷時以指數退避自動重連，並偵測斷線期間遺失的資料區間。
+
+    更新字典的 kind 欄位：
+      'kline'：symbol、time、price (收盤價)、open、high、low、start、closed
+      'ticker'：symbol、time、price (最新成交價)
+      'gap'：symbol、start、end (遺失資料的毫秒區間，可用 REST K 線補齊後檢查停損)
+    :param symbols: 交易對，例如 ['BTCUSDT']
+    :param interval: K 線週期，kind='kline' 時使用
+    :param kind: 'kline' 或 'ticker'
+    :param transport: 傳輸層，預設為 WebSocketTransport
+    :param url: websocket 位址，預設為幣安的合併串流
+    :param record_path: 將收到的原始訊息逐行附加寫入此檔案，供 ReplayTransport 重播
+    """
+
+    def __init__(self, symbols, interval='1m', kind='kline', transport=None, url=None, queue_size=QUEUE_SIZE,
+                 reconnect_delay=1.0, max_reconnect_delay=30.0, gap_ms=TICKER_GAP_MS, record_path=None):
+        if kind not in ('kline', 'ticker'):
+            raise ValueError(f"不支援的串流類型: {kind}")
+        self.symbols = [s.upper() for s in symbols]
+        self.interval = interval
+        self.interval_ms = interval_ms(interval)
+        self.kind = kind
+        self.transport = transport or WebSocketTransport()
+        streams = [f"{s.lower()}@kline_{interval}" if kind == 'kline' else f"{s.lower()}@ticker"
+                   for s in self.symbols]
+        self.url = url or f"{BINANCE_WS_URL}?streams={'/'.join(streams)}"
+        self.queue = ConflatingQueue(queue_size)
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.gap_ms = gap_ms
+        self.record_path = record_path
+
+        self.reconnects = 0
+        self.gaps = 0
+        self.messages = 0
+        self._last_start = {}  # symbol -> 最後一根 K 線的開始時間
+        self._last_closed = {}  # symbol -> 最後一根 K 線是否已收到收盤更新
+        self._last_event = {}  # symbol -> 最後一筆 ticker 的事件時間
+        self._received = False
+        self._record = None
+        self._conn = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def finished(self):
+        """
+        串流已停止 (呼叫 stop() 或重播資料結束) 且佇列已清空。
+        """
+        return self.queue.closed and len(self.queue) == 0
+
+    def start(self):
+        if self.record_path:
+            self._record = open(self.record_path, "a")
+        self._thread = threading.Thread(target=self._run, name="binance-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            conn = self._conn
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self.queue.close()
+        if self._record is not None:
+            self._record.close()
+            self._record = None
+
+    def get(self, timeout=None):
+        """
+        取出下一筆更新，逾時返回 None。
+        """
+        return self.queue.get(timeout)
+
+    def _run(self):
+        delay = self.reconnect_delay
+        while not self._stop.is_set():
+            self._received = False
+            try:
+                conn = self.transport.connect(self.url)
+                with self._lock:
+                    self._conn = conn
+                print(f"幣安串流已連線: {', '.join(self.symbols)}")
+                self._consume(conn)
+            except EOFError as e:
+                print(f"幣安串流結束: {e}")
+                break
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                print(f"幣安串流中斷: {e}")
+            finally:
+                with self._lock:
+                    conn, self._conn = self._conn, None
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+            if self._stop.is_set():
+                break
+            # 連線曾正常收到資料時重置退避時間，否則逐次加倍
+            if self._received:
+                delay = self.reconnect_delay
+            self.reconnects += 1
+            print(f"{delay:.1f} 秒後重新連線幣安串流 (第 {self.reconnects} 次)...")
+            if self._stop.wait(delay):
+                break
+            delay = min(delay * 2, self.max_reconnect_delay)
+        self.queue.close()
+
+    def _consume(self, conn):
+        while not self._stop.is_set():
+            message = conn.recv()
+            if not message:
+                raise ConnectionError("伺服器關閉連線")
+            self._received = True
+            self.messages += 1
+            if self._record is not None:
+                self._record.write(message + "\n")
+            self._handle(json.loads(message))
+
+    def _handle(self, message):
+        # 合併串流的資料包在 data 欄位中，單一串流則直接是事件本身
+        data = message.get("data", message)
+        event = data.get("e")
+        symbol = data.get("s")
+        if event == "kline":
+            self._handle_kline(symbol, data)
+        elif event in ("24hrTicker", "24hrMiniTicker"):
+            self._handle_ticker(symbol, data)
+
+    def _handle_kline(self, symbol, data):
+        k = data["k"]
+        start = k["t"]
+        last_start = self._last_start.get(symbol)
+        if last_start is not None and start > last_start:
+            # 上一根 K 線沒有收到收盤更新時，它的最後一段資料也遺失了
+            gap_start = last_start + self.interval_ms if self._last_closed.get(symbol) else last_start
+            if gap_start < start:
+                self._gap(symbol, gap_start, start - 1)
+        elif last_start is not None and start < last_start:
+            return  # 重連後收到的舊 K 線
+        self._last_start[symbol] = start
+        self._last_closed[symbol] = k["x"]
+        # 同一根 K 線的更新會合併；最高/最低價是整根 K 線累計的，消費端以 low 檢查停損時不會漏掉 K 線內的回落
+        self.queue.put((symbol, 'kline', start), {
+            'kind': 'kline',
+            'symbol': symbol,
+            'time': data.get("E", k["T"]),
+            'price': float(k["c"]),
+            'open': float(k["o"]),
+            'high': float(k["h"]),
+            'low': float(k["l"]),
+            'start': start,
+            'closed': k["x"],
+        })
+
+    def _handle_ticker(self, symbol, data):
+        event_time = data["E"]
+        last_event = self._last_event.get(symbol)
+        if last_event is not None:
+            if event_time <= last_event:
+                return
+            if event_time - last_event > self.gap_ms:
+                self._gap(symbol, last_event + 1, event_time - 1)
+        self._last_event[symbol] = event_time
+        self.queue.put((symbol, 'ticker'), {
+            'kind': 'ticker',
+            'symbol': symbol,
+            'time': event_time,
+            'price': float(data["c"]),
+        })
+
+    def _gap(self, symbol, start, end):
+        self.gaps += 1
+        print(f"{symbol} 串流資料缺口: {start} ~ {end}")
+        self.queue.put((symbol, 'gap', start), {'kind': 'gap', 'symbol': symbol, 'start': start, 'end': end})
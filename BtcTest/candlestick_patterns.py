@@ -0,0 +1,216 @@
+import numpy as np
+
+PATTERNS = ("hammer", "inverted_hammer", "bullish_engulfing", "bearish_engulfing", "doji")
+
+# 出場原因
+EXIT_STOP = 0
+EXIT_TARGET = 1
+EXIT_TIMEOUT = 2
+EXIT_END = 3
+EXIT_REASONS = ("STOP_LOSS", "TAKE_PROFIT", "TIMEOUT", "END")
+
+# 每筆交易一列：交易對索引、進出場 K 線索引、進出場價格、出場原因、報酬率
+PATTERN_TRADE_DTYPE = np.dtype([
+    ('symbol_id', np.int32),
+    ('entry_index', np.int64),
+    ('exit_index', np.int64),
+    ('entry_price', np.float64),
+    ('exit_price', np.float64),
+    ('reason', np.int8),
+    ('return', np.float64),
+])
+
+
+def _shape(open_, high, low, close):
+    open_, high, low, close = (np.asarray(a, dtype=np.float64) for a in (open_, high, low, close))
+    body = np.abs(close - open_)
+    candle_range = high - low
+    upper = high - np.maximum(open_, close)
+    lower = np.minimum(open_, close) - low
+    return body, candle_range, upper, lower
+
+
+def _previous(values):
+    # 沿最後一個軸往後移一根，第一根補 NaN (任何比較皆為 False)
+    shifted = np.empty_like(values)
+    shifted[..., 0] = np.nan
+    shifted[..., 1:] = values[..., :-1]
+    return shifted
+
+
+def hammer(open_, high, low, close, shadow_ratio=2.0, max_upper_ratio=0.1, max_body_ratio=0.35):
+    """
+    錘子線：實體小、下影線至少為實體的 shadow_ratio 倍、幾乎沒有上影線。
+    所有形態函數都接受一維 (單一交易對) 或二維 (每列一個交易對) 陣列，NaN 的 K 線不會被判定為任何形態。
+    :return: 與輸入同形狀的布林陣列
+    """
+    body, candle_range, upper, lower = _shape(open_, high, low, close)
+    return ((candle_range > 0) & (lower >= shadow_ratio * body) & (upper <= max_upper_ratio * candle_range) &
+            (body <= max_body_ratio * candle_range))
+
+
+def inverted_hammer(open_, high, low, close, shadow_ratio=2.0, max_lower_ratio=0.1, max_body_ratio=0.35):
+    """
+    倒錘子線：實體小、上影線至少為實體的 shadow_ratio 倍、幾乎沒有下影線。
+    """
+    body, candle_range, upper, lower = _shape(open_, high, low, close)
+    return ((candle_range > 0) & (upper >= shadow_ratio * body) & (lower <= max_lower_ratio * candle_range) &
+            (body <= max_body_ratio * candle_range))
+
+
+def bullish_engulfing(open_, high, low, close):
+    """
+    多頭吞噬：前一根收黑，本根收紅且實體完全包住前一根的實體。
+    """
+    open_, close = np.asarray(open_, dtype=np.float64), np.asarray(close, dtype=np.float64)
+    prev_open, prev_close = _previous(open_), _previous(close)
+    return ((prev_close < prev_open) & (close > open_) & (open_ <= prev_close) & (close >= prev_open) &
+            (close - open_ > prev_open - prev_close))
+
+
+def bearish_engulfing(open_, high, low, close):
+    """
+    空頭吞噬：前一根收紅，本根收黑且實體完全包住前一根的實體。
+    """
+    open_, close = np.asarray(open_, dtype=np.float64), np.asarray(close, dtype=np.float64)
+    prev_open, prev_close = _previous(open_), _previous(close)
+    return ((prev_close > prev_open) & (close < open_) & (open_ >= prev_close) & (close <= prev_open) &
+            (open_ - close > prev_close - prev_open))
+
+
+def doji(open_, high, low, close, max_body_ratio=0.1):
+    """
+    十字線：實體不超過整根 K 線範圍的 max_body_ratio。
+    """
+    body, candle_range, _, _ = _shape(open_, high, low, close)
+    return (candle_range > 0) & (body <= max_body_ratio * candle_range)
+
+
+_PATTERN_FUNCTIONS = {
+    "hammer": hammer,
+    "inverted_hammer": inverted_hammer,
+    "bullish_engulfing": bullish_engulfing,
+    "bearish_engulfing": bearish_engulfing,
+    "doji": doji,
+}
+
+
+def scan_patterns(open_, high, low, close, patterns=PATTERNS):
+    """
+    一次掃描多種形態。
+    :return: 形態名稱 -> 布林陣列
+    """
+    return {name: _PATTERN_FUNCTIONS[name](open_, high, low, close) for name in patterns}
+
+
+def align_ohlc(series):
+    """
+    將多個交易對的 K 線依時間對齊成二維陣列，某交易對沒有資料的時間補 NaN。
+    :param series: symbol -> (時間陣列, open, high, low, close)
+    :return: (symbols, 時間陣列, open, high, low, close)，價格陣列形狀為 (交易對數, K 線數)
+    """
+    symbols = list(series)
+    times = np.unique(np.concatenate([np.asarray(series[s][0], dtype=np.int64) for s in symbols])) \
+        if symbols else np.empty(0, dtype=np.int64)
+    columns = [np.full((len(symbols), len(times)), np.nan) for _ in range(4)]
+    for row, symbol in enumerate(symbols):
+        symbol_times, *prices = series[symbol]
+        index = np.searchsorted(times, np.asarray(symbol_times, dtype=np.int64))
+        for column, values in zip(columns, prices):
+            column[row, index] = values
+    return (symbols, times, *columns)
+
+
+def backtest_pattern_entries(high, low, close, entries, stop_loss_pct=0.02, take_profit_pct=0.04,
+                             max_holding=96):
+    """
+    以形態訊號進場的回測，所有交易對同時處理，只沿時間軸迴圈一次。
+    訊號 K 線收盤進場，每個交易對同時最多持有一筆；之後每根 K 線先檢查止損 (最低價)，
+    再檢查止盈 (最高價)，持有超過 max_holding 根以收盤價出場，資料結束時以最後收盤價平倉。
+    :param entries: 進場訊號布林陣列，形狀同價格陣列 (交易對數, K 線數)
+    :param max_holding: 最長持有 K 線數，None 表示不限
+    :return: PATTERN_TRADE_DTYPE 交易陣列，依出場順序排列 (資料結束時的平倉在最後)
+    """
+    high, low, close = (np.atleast_2d(np.asarray(a, dtype=np.float64)) for a in (high, low, close))
+    entries = np.atleast_2d(np.asarray(entries, dtype=bool))
+    count, bars = close.shape
+    symbol_ids = np.arange(count)
+
+    in_position = np.zeros(count, dtype=bool)
+    entry_index = np.zeros(count, dtype=np.int64)
+    entry_price = np.zeros(count)
+    stop_price = np.zeros(count)
+    target_price = np.zeros(count)
+    last_index = np.full(count, -1, dtype=np.int64)
+    chunks = []
+
+    def close_positions(mask, t, prices, reason):
+        chunks.append((symbol_ids[mask], entry_index[mask], np.broadcast_to(t, count)[mask],
+                       entry_price[mask], prices[mask], np.full(int(mask.sum()), reason)))
+        in_position[mask] = False
+
+    for t in range(bars):
+        low_t, high_t, close_t = low[:, t], high[:, t], close[:, t]
+        if in_position.any():
+            stopped = in_position & (low_t <= stop_price)
+            if stopped.any():
+                close_positions(stopped, t, stop_price, EXIT_STOP)
+            hit_target = in_position & (high_t >= target_price)
+            if hit_target.any():
+                close_positions(hit_target, t, target_price, EXIT_TARGET)
+            if max_holding is not None:
+                timeout = in_position & (t - entry_index >= max_holding) & ~np.isnan(close_t)
+                if timeout.any():
+                    close_positions(timeout, t, close_t, EXIT_TIMEOUT)
+
+        valid = ~np.isnan(close_t)
+        last_index[valid] = t
+        enter = entries[:, t] & ~in_position & valid
+        if enter.any():
+            in_position |= enter
+            entry_index[enter] = t
+            entry_price[enter] = close_t[enter]
+            stop_price[enter] = close_t[enter] * (1 - stop_loss_pct)
+            target_price[enter] = close_t[enter] * (1 + take_profit_pct)
+
+    if in_position.any():
+        final_close = close[symbol_ids, np.maximum(last_index, 0)]
+        chunks.append((symbol_ids[in_position], entry_index[in_position], last_index[in_position],
+                       entry_price[in_position], final_close[in_position],
+                       np.full(int(in_position.sum()), EXIT_END)))
+
+    trades = np.empty(sum(len(chunk[0]) for chunk in chunks), dtype=PATTERN_TRADE_DTYPE)
+    offset = 0
+    for symbol, entered, exited, entry, exit_, reason in chunks:
+        size = len(symbol)
+        block = trades[offset:offset + size]
+        block['symbol_id'] = symbol
+        block['entry_index'] = entered
+        block['exit_index'] = exited
+        block['entry_price'] = entry
+        block['exit_price'] = exit_
+        block['reason'] = reason
+        offset += size
+    trades['return'] = trades['exit_price'] / trades['entry_price'] - 1.0
+    return trades
+
+
+def pattern_summary(trades, symbols):
+    """
+    返回每個交易對的交易次數、勝率、平均報酬率及複利累計報酬率 (每筆投入全部資金)。
+    """
+    count = len(symbols)
+    ids = trades['symbol_id']
+    returns = trades['return']
+    trade_count = np.bincount(ids, minlength=count)
+    wins = np.bincount(ids, weights=returns > 0, minlength=count)
+    total = np.bincount(ids, weights=returns, minlength=count)
+    compounded = np.exp(np.bincount(ids, weights=np.log1p(returns), minlength=count)) - 1.0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        win_rate = np.where(trade_count > 0, wins / trade_count, 0.0)
+        average = np.where(trade_count > 0, total / trade_count, 0.0)
+    return [
+        {"symbol": symbol, "trades": int(trade_count[i]), "win_rate": float(win_rate[i]),
+         "average_return": float(average[i]), "total_return": float(compounded[i])}
+        for i, symbol in enumerate(symbols)
+    ]
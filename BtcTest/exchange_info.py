@@ -0,0 +1,190 @@
+import json
+import os
+import threading
+import time
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP
+
+EXCHANGE_INFO_FILE = "exchange_info.json"
+REFRESH_INTERVAL = 3600  # 每小時在背景重新下載一次交易規則
+
+_ZERO = Decimal(0)
+
+
+def _filter_value(filters, filter_type, key):
+    value = filters.get(filter_type, {}).get(key)
+    return Decimal(value) if value is not None else _ZERO
+
+
+class SymbolRules:
+    """
+    單一交易對的下單規則 (LOT_SIZE / PRICE_FILTER / MIN_NOTIONAL)，數值以 Decimal 預先解析，
+    下單時直接量化及檢查，不需要再查詢交易所。
+    """
+
+    __slots__ = ("symbol", "step_size", "min_qty", "max_qty", "tick_size", "min_price", "max_price",
+                 "min_notional")
+
+    def __init__(self, symbol, filters):
+        """
+        :param filters: filterType -> 該過濾器的原始欄位
+        """
+        self.symbol = symbol
+        self.step_size = _filter_value(filters, 'LOT_SIZE', 'stepSize')
+        self.min_qty = _filter_value(filters, 'LOT_SIZE', 'minQty')
+        self.max_qty = _filter_value(filters, 'LOT_SIZE', 'maxQty')
+        self.tick_size = _filter_value(filters, 'PRICE_FILTER', 'tickSize')
+        self.min_price = _filter_value(filters, 'PRICE_FILTER', 'minPrice')
+        self.max_price = _filter_value(filters, 'PRICE_FILTER', 'maxPrice')
+        # 新版交易所資訊以 NOTIONAL 取代 MIN_NOTIONAL
+        self.min_notional = (_filter_value(filters, 'MIN_NOTIONAL', 'minNotional') or
+                             _filter_value(filters, 'NOTIONAL', 'minNotional'))
+
+    def quantize_quantity(self, quantity):
+        """
+        將數量無條件捨去到 stepSize 的整數倍，避免超過可用金額。
+        """
+        quantity = Decimal(str(quantity))
+        if not self.step_size:
+            return quantity
+        return (quantity / self.step_size).to_integral_value(rounding=ROUND_DOWN) * self.step_size
+
+    def quantize_price(self, price):
+        """
+        將價格四捨五入到 tickSize 的整數倍。
+        """
+        price = Decimal(str(price))
+        if not self.tick_size:
+            return price
+        return (price / self.tick_size).to_integral_value(rounding=ROUND_HALF_UP) * self.tick_size
+
+    def validate(self, quantity, price):
+        """
+        在本地檢查數量與金額是否符合交易規則，符合時返回 None，否則返回錯誤訊息。
+        """
+        quantity = Decimal(str(quantity))
+        price = Decimal(str(price))
+        if quantity <= 0 or quantity < self.min_qty:
+            return f"數量 {quantity} 低於最小數量 {self.min_qty}"
+        if self.max_qty and quantity > self.max_qty:
+            return f"數量 {quantity} 超過最大數量 {self.max_qty}"
+        if self.step_size and (quantity - self.min_qty) % self.step_size:
+            return f"數量 {quantity} 不是 stepSize {self.step_size} 的整數倍"
+        if quantity * price < self.min_notional:
+            return f"下單金額 {quantity * price} 低於最小金額 {self.min_notional}"
+        return None
+
+    def format_quantity(self, quantity):
+        """
+        以不含科學記號的字串表示數量，供下單參數使用。
+        """
+        return format(Decimal(quantity).normalize(), 'f')
+
+
+class ExchangeInfoCache:
+    """
+    幣安交易規則快取。啟動時從磁碟載入 (沒有時下載一次 get_exchange_info)，
+    之後在背景定期重新下載並寫回磁碟，下單時只讀取記憶體中的規則。
+    """
+
+    def __init__(self, client, path=EXCHANGE_INFO_FILE, refresh_interval=REFRESH_INTERVAL):
+        self.client = client
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.rules = {}
+        self.updated = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def load(self):
+        """
+        從磁碟載入交易規則，檔案不存在、損壞或過期時重新下載。
+        已有本地規則時下載失敗只記錄錯誤並沿用舊規則，由背景更新重試。
+        """
+        try:
+            with open(self.path, "r") as f:
+                data = json.load(f)
+            self._set(data["symbols"], data["updated"])
+        except (OSError, ValueError, KeyError):
+            pass
+        if not self.rules:
+            self.refresh()
+        elif time.time() - self.updated >= self.refresh_interval:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"更新交易規則失敗，沿用本地規則：{e}")
+        return self
+
+    def refresh(self):
+        """
+        下載所有交易對的交易規則，一次 API 呼叫即可取得全部資料。
+        """
+        info = self.client.get_exchange_info()
+        symbols = {
+            s['symbol']: {f['filterType']: f for f in s.get('filters', [])}
+            for s in info.get('symbols', [])
+        }
+        updated = time.time()
+        self._set(symbols, updated)
+        self._save(symbols, updated)
+        print(f"已更新 {len(symbols)} 個交易對的交易規則")
+
+    def get(self, symbol):
+        """
+        返回交易對的 SymbolRules，本地沒有時重新下載一次。
+        """
+        rules = self.rules.get(symbol)
+        if rules is None:
+            self.refresh()
+            rules = self.rules.get(symbol)
+            if rules is None:
+                raise KeyError(f"找不到交易對 {symbol} 的交易規則")
+        return rules
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="exchange-info", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                # 更新失敗時沿用舊規則，下一個週期再試
+                print(f"更新交易規則失敗：{e}")
+
+    def _set(self, symbols, updated):
+        rules = {symbol: SymbolRules(symbol, filters) for symbol, filters in symbols.items()}
+        with self._lock:
+            # 整個字典一次替換，讀取端不需要加鎖
+            self.rules = rules
+            self.updated = updated
+
+    def _save(self, symbols, updated):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"updated": updated, "symbols": symbols}, f)
+        os.replace(tmp_path, self.path)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_exchange_info(client):
+    """
+    取得共用的交易規則快取，第一次呼叫時載入並啟動背景更新。
+    """
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ExchangeInfoCache(client).load()
+            _cache.start()
+        return _cache
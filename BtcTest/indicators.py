@@ -0,0 +1,112 @@
+"""
+固定容量的環形緩衝區與滾動移動平均。
+每次 update() 為 O(1)，記憶體不隨執行時間增長。
+"""
+import math
+from array import array
+
+# 滾動總和每經過這麼多輪視窗就重新加總一次，消除浮點誤差累積
+_RESUM_CYCLES = 64
+
+
+class RingBuffer:
+    """
+    以 array.array 實作的固定容量環形緩衝區，滿了之後新值覆蓋最舊的值。
+    迭代順序為由舊到新。
+    """
+
+    __slots__ = ("capacity", "_data", "_start", "_size")
+
+    def __init__(self, capacity, typecode='d'):
+        if capacity <= 0:
+            raise ValueError("capacity 必須大於 0")
+        self.capacity = capacity
+        self._data = array(typecode, [0] * capacity)
+        self._start = 0
+        self._size = 0
+
+    def append(self, value):
+        """
+        加入新值，緩衝區已滿時返回被覆蓋的最舊值，否則返回 None。
+        """
+        if self._size < self.capacity:
+            self._data[(self._start + self._size) % self.capacity] = value
+            self._size += 1
+            return None
+        evicted = self._data[self._start]
+        self._data[self._start] = value
+        self._start = (self._start + 1) % self.capacity
+        return evicted
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+
+    @property
+    def full(self):
+        return self._size == self.capacity
+
+    @property
+    def last(self):
+        if not self._size:
+            return None
+        return self._data[(self._start + self._size - 1) % self.capacity]
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("RingBuffer 索引超出範圍")
+        return self._data[(self._start + index) % self.capacity]
+
+    def __iter__(self):
+        for i in range(self._size):
+            yield self._data[(self._start + i) % self.capacity]
+
+    def tolist(self):
+        return list(self)
+
+
+class SMA:
+    """
+    簡單移動平均。視窗未滿時 value 為目前所有值的平均，ready 表示視窗已滿。
+    """
+
+    __slots__ = ("window", "_buffer", "_sum", "_updates")
+
+    def __init__(self, window):
+        self.window = window
+        self._buffer = RingBuffer(window)
+        self._sum = 0.0
+        self._updates = 0
+
+    def update(self, value):
+        evicted = self._buffer.append(value)
+        self._sum += value - (evicted or 0.0)
+        self._updates += 1
+        if self._updates % (self.window * _RESUM_CYCLES) == 0:
+            self._sum = math.fsum(self._buffer)
+        return self.value
+
+    def reset(self):
+        self._buffer.clear()
+        self._sum = 0.0
+        self._updates = 0
+
+    @property
+    def ready(self):
+        return self._buffer.full
+
+    @property
+    def value(self):
+        count = len(self._buffer)
+        return self._sum / count if count else None
+
+    def tolist(self):
+        """
+        返回視窗內的值 (由舊到新)，依序 update() 即可重建相同狀態。
+        """
+        return self._buffer.tolist()
@@ -0,0 +1,153 @@
+import math
+import os
+import struct
+import time
+import zlib
+from array import array
+
+from indicators import SMA
+
+CHECKPOINT_FILE = "strategy_state.bin"
+FORMAT_VERSION = 1  # 檔案格式版本，格式變更時遞增，舊程式不會誤讀新格式
+MOVING_AVERAGE_WINDOW = 10
+
+_MAGIC = b"BTCS"
+# magic、格式版本、狀態版本、寫入時間、capital、position_size、initial_stop_loss_pct、target_gain_pct、
+# btc_quantity、stop_loss_price (None 以 NaN 表示)、num_positions、移動平均視窗、持倉筆數、價格筆數
+_HEADER = struct.Struct("<4sHQd6d4I")
+_CRC = struct.Struct("<I")
+
+
+class StrategyState:
+    """
+    加倉策略的狀態。持倉階梯以兩個 array('d') 保存 (進場價、投入金額)，
+    移動平均線以固定視窗的 SMA 保存，記憶體大小固定。
+    每次狀態改變時遞增 version，checkpoint() 只在 version 改變後才寫入磁碟。
+    """
+
+    __slots__ = ("capital", "position_size", "initial_stop_loss_pct", "target_gain_pct", "num_positions",
+                 "btc_quantity", "stop_loss_price", "entry_prices", "entry_amounts", "prices", "version",
+                 "_saved_version")
+
+    def __init__(self, capital, num_positions, initial_stop_loss_pct=0.5, target_gain_pct=0.05,
+                 window=MOVING_AVERAGE_WINDOW):
+        self.capital = capital
+        self.position_size = capital / num_positions
+        self.initial_stop_loss_pct = initial_stop_loss_pct
+        self.target_gain_pct = target_gain_pct
+        self.num_positions = num_positions
+        self.btc_quantity = 0.0
+        self.stop_loss_price = None
+        self.entry_prices = array('d')
+        self.entry_amounts = array('d')
+        self.prices = SMA(window)  # 最近加倉價格的移動平均線
+        self.version = 0
+        self._saved_version = None
+
+    @property
+    def position_count(self):
+        return len(self.entry_prices)
+
+    @property
+    def last_entry_price(self):
+        return self.entry_prices[-1] if self.entry_prices else None
+
+    @property
+    def positions(self):
+        """
+        以 (進場價, 投入金額) 列表表示的持倉階梯。
+        """
+        return list(zip(self.entry_prices, self.entry_amounts))
+
+    def add_position(self, price, amount):
+        self.entry_prices.append(price)
+        self.entry_amounts.append(amount)
+        self.btc_quantity += amount / price
+        self.prices.update(price)
+        self.version += 1
+
+    def clear_positions(self):
+        del self.entry_prices[:]
+        del self.entry_amounts[:]
+        self.btc_quantity = 0.0
+        self.stop_loss_price = None
+        self.prices.reset()
+        self.version += 1
+
+    def to_bytes(self):
+        prices = array('d', self.prices.tolist())
+        stop_loss_price = math.nan if self.stop_loss_price is None else self.stop_loss_price
+        header = _HEADER.pack(
+            _MAGIC, FORMAT_VERSION, self.version, time.time(),
+            self.capital, self.position_size, self.initial_stop_loss_pct, self.target_gain_pct,
+            self.btc_quantity, stop_loss_price,
+            self.num_positions, self.prices.window, len(self.entry_prices), len(prices),
+        )
+        body = header + self.entry_prices.tobytes() + self.entry_amounts.tobytes() + prices.tobytes()
+        return body + _CRC.pack(zlib.crc32(body))
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        由 to_bytes() 的內容還原狀態，格式不符或校驗失敗時拋出 ValueError。
+        """
+        if len(data) < _HEADER.size + _CRC.size:
+            raise ValueError("檢查點檔案不完整")
+        body, (crc,) = data[:-_CRC.size], _CRC.unpack(data[-_CRC.size:])
+        if zlib.crc32(body) != crc:
+            raise ValueError("檢查點檔案校驗失敗")
+        (magic, format_version, version, _saved_at, capital, position_size, initial_stop_loss_pct,
+         target_gain_pct, btc_quantity, stop_loss_price, num_positions, window, position_count,
+         price_count) = _HEADER.unpack_from(body)
+        if magic != _MAGIC or format_version != FORMAT_VERSION:
+            raise ValueError(f"不支援的檢查點格式: {magic!r} v{format_version}")
+        if len(body) != _HEADER.size + 8 * (2 * position_count + price_count):
+            raise ValueError("檢查點檔案長度不符")
+
+        state = cls(capital, num_positions, initial_stop_loss_pct, target_gain_pct, window)
+        state.position_size = position_size
+        state.btc_quantity = btc_quantity
+        state.stop_loss_price = None if math.isnan(stop_loss_price) else stop_loss_price
+        offset = _HEADER.size
+        for values in (state.entry_prices, state.entry_amounts):
+            values.frombytes(body[offset:offset + 8 * position_count])
+            offset += 8 * position_count
+        for price in array('d', body[offset:]):
+            state.prices.update(price)
+        state.version = state._saved_version = version
+        return state
+
+    def save(self, path=CHECKPOINT_FILE):
+        """
+        原子寫入檢查點：先寫入暫存檔並 fsync，再以 os.replace 取代舊檔，中途當機不會留下半個檔案。
+        """
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(self.to_bytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        self._saved_version = self.version
+
+    def checkpoint(self, path=CHECKPOINT_FILE):
+        """
+        狀態自上次寫入後有改變時才寫入檢查點，返回是否有寫入。
+        """
+        if self.version == self._saved_version:
+            return False
+        self.save(path)
+        return True
+
+    @classmethod
+    def load(cls, path=CHECKPOINT_FILE):
+        """
+        讀取檢查點，檔案不存在或損壞時返回 None。
+        """
+        try:
+            with open(path, "rb") as f:
+                return cls.from_bytes(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, struct.error) as e:
+            print(f"讀取策略檢查點失敗，重新開始：{e}")
+            return None
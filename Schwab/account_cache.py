@@ -0,0 +1,143 @@
+import threading
+import time
+
+import requests
+
+from quote_client import get_quote_client
+from schwab_client import get_schwab_client
+from trade_logger import log_to_file
+
+
+def fetch_account_snapshot(base_url, headers):
+    """
+    查詢所有帳戶的現金餘額與持倉，不查詢報價。
+    :return: (現金餘額, 持倉列表)，查詢失敗時返回 None
+    """
+    try:
+        params = {'fields': 'positions'}
+        response = get_schwab_client(base_url).get('accounts', headers=headers, params=params, endpoint="accounts")
+        log_to_file(f"/accounts API 回應結束, status_code={response.status_code}", "DEBUG")
+
+        if response.status_code != 200:
+            log_to_file(f"查詢帳戶及持倉失敗，錯誤代碼: {response.status_code}, 錯誤信息: {response.text}", "ERROR")
+            return None
+
+        total_cash_balance = 0.0
+        positions = []
+        for account in response.json():
+            account_info = account.get('securitiesAccount', {})
+            total_cash_balance += account_info.get('currentBalances', {}).get('cashBalance', 0.0)
+            for position in account_info.get('positions', []):
+                positions.append({
+                    "symbol": position['instrument'].get('symbol', None),
+                    "quantity": position.get('longQuantity', 0.0),
+                    "average_price": position.get('averagePrice', 0.0),
+                })
+        return total_cash_balance, positions
+    except requests.exceptions.Timeout:
+        log_to_file("查詢帳戶及持倉時超時，請檢查 API 或網路環境。", "ERROR")
+        return None
+    except Exception as e:
+        log_to_file(f"查詢帳戶及持倉遇到未預期錯誤: {e}", "ERROR")
+        return None
+
+
+def build_holdings(positions, prices):
+    """
+    以持倉與報價組合出策略使用的持倉字典列表，沒有報價的股票 current_price 為 None。
+    """
+    holdings = []
+    for position in positions:
+        symbol = position["symbol"]
+        quantity = position["quantity"]
+        average_price = position["average_price"]
+        current_price = prices.get(symbol)
+
+        if current_price is not None and average_price > 0:
+            profit_percent = ((current_price - average_price) / average_price * 100)
+        else:
+            profit_percent = None
+
+        if symbol and quantity > 0:
+            holdings.append({
+                "symbol": symbol,
+                "quantity": quantity,
+                "average_price": average_price,
+                "current_price": current_price,
+                "market_value": quantity * current_price if current_price else 0.0,
+                "profit_percent": profit_percent
+            })
+    return holdings
+
+
+def quote_positions(finnhub_api_key, positions, symbols=None):
+    """
+    一次並發查詢持倉所需的即時價格並組合成持倉字典列表。
+    :param symbols: 只查詢這些股票的報價，None 表示查詢全部持倉
+    """
+    if symbols is None:
+        wanted = [p["symbol"] for p in positions]
+    else:
+        wanted_set = {s.upper() for s in symbols}
+        wanted = [p["symbol"] for p in positions if p["symbol"] and p["symbol"].upper() in wanted_set]
+    prices = get_quote_client(finnhub_api_key).get_quotes(wanted) if wanted else {}
+    return build_holdings(positions, prices)
+
+
+class AccountSnapshotCache:
+    """
+    帳戶快照快取。持倉只會因下單而改變，因此保存最近一次的 /accounts 結果，
+    只在自己下單後或快照超過 ttl 秒時才重新查詢。
+    下單後的 settle_seconds 秒內改以較短的 settle_ttl 重新查詢，以便盡快看到限價單成交。
+    :param ttl: 沒有下單活動時快照的有效秒數
+    :param settle_seconds: 下單後視為持倉可能變動的時間長度
+    :param settle_ttl: 持倉可能變動期間的快照有效秒數
+    """
+
+    def __init__(self, base_url, headers, ttl=3600, settle_seconds=300, settle_ttl=30, clock=time.monotonic):
+        self.base_url = base_url
+        self.headers = headers
+        self.ttl = ttl
+        self.settle_seconds = settle_seconds
+        self.settle_ttl = settle_ttl
+        self._clock = clock
+
+        self._snapshot = None
+        self._fetched_at = 0.0
+        self._settle_until = 0.0
+        self._dirty = True
+        self._lock = threading.Lock()
+        self.fetches = 0
+
+    def invalidate(self):
+        """
+        標記快照過期，通常在下單或收到成交通知後呼叫。
+        """
+        with self._lock:
+            self._dirty = True
+            self._settle_until = self._clock() + self.settle_seconds
+
+    def get_snapshot(self, force=False):
+        """
+        返回 (現金餘額, 持倉列表)，需要時才重新查詢；查詢失敗時沿用舊快照。
+        """
+        with self._lock:
+            now = self._clock()
+            ttl = self.settle_ttl if now < self._settle_until else self.ttl
+            if force or self._dirty or self._snapshot is None or now - self._fetched_at >= ttl:
+                snapshot = fetch_account_snapshot(self.base_url, self.headers)
+                self.fetches += 1
+                if snapshot is not None:
+                    self._snapshot = snapshot
+                    self._fetched_at = now
+                    self._dirty = False
+                    log_to_file(f"成功獲取帳戶數據: 現金餘額 ${snapshot[0]:.2f}")
+            return self._snapshot or (0.0, [])
+
+    def get_positions_and_cash(self, finnhub_api_key, symbols=None):
+        """
+        與 live_trading.get_positions_and_cash 返回相同格式，但帳戶資料來自快取，
+        且只查詢 symbols 指定股票的報價 (None 表示全部持倉)。
+        """
+        cash, positions = self.get_snapshot()
+        return cash, quote_positions(finnhub_api_key, positions, symbols)
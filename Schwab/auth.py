@@ -1,10 +1,13 @@
 import requests
 import json
 import base64
+import tempfile
+import threading
 from urllib.parse import urlparse, parse_qs
 from dotenv import load_dotenv
 import os
 from datetime import datetime, timedelta
+from trade_logger import log_to_file
 
 # 載入環境變數
 load_dotenv()
@@ -16,18 +19,31 @@ if not appKey or not appSecret:
     raise ValueError("APP_KEY 或 APP_SECRET 未在 .env 中設定")
 
 TOKEN_FILE = "tokens.json"
+TOKEN_URL = 'https://api.schwabapi.com/v1/oauth/token'
+REFRESH_MARGIN_SECONDS = 300  # 在 Access Token 過期前多少秒於背景刷新
 
-def log_to_file(message, log_type="INFO"):
+
+def _basic_auth_header():
+    return f'Basic {base64.b64encode(bytes(f"{appKey}:{appSecret}", "utf-8")).decode("utf-8")}'
+
+
+def save_tokens(tokens, token_file=TOKEN_FILE):
     """
-    改進的日誌記錄函數。
-    :param message: 日誌消息
-    :param log_type: 日誌類型，例如 "INFO", "ERROR", "TRADE"
+    以原子方式寫入 Token 檔：先寫入同目錄的暫存檔再替換，避免中途失敗留下不完整的 JSON。
     """
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    formatted_message = f"[{timestamp}] [{log_type}] {message}"
-    with open("trade_log.txt", "a") as log_file:
-        log_file.write(formatted_message + "\n")
-    print(formatted_message)
+    directory = os.path.dirname(os.path.abspath(token_file))
+    fd, tmp_path = tempfile.mkstemp(prefix=".tokens-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(tokens, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, token_file)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
 
 def authenticate_user():
     """
@@ -45,7 +61,7 @@ def authenticate_user():
 
     # 構建請求以取得 access_token
     headers = {
-        'Authorization': f'Basic {base64.b64encode(bytes(f"{appKey}:{appSecret}", "utf-8")).decode("utf-8")}',
+        'Authorization': _basic_auth_header(),
         'Content-Type': 'application/x-www-form-urlencoded'
     }
     data = {
@@ -54,12 +70,11 @@ def authenticate_user():
         'redirect_uri': 'https://127.0.0.1'
     }
 
-    response = requests.post('https://api.schwabapi.com/v1/oauth/token', headers=headers, data=data)
+    response = requests.post(TOKEN_URL, headers=headers, data=data, timeout=30)
     if response.status_code == 200:
         tokens = response.json()
         tokens['expires_at'] = (datetime.utcnow() + timedelta(seconds=tokens['expires_in'])).isoformat()
-        with open(TOKEN_FILE, "w") as f:
-            json.dump(tokens, f)
+        save_tokens(tokens)
         print("Token 已成功保存到 tokens.json")
     else:
         print("授權失敗")
@@ -67,75 +82,197 @@ def authenticate_user():
         exit(1)
 
 
-def refresh_access_token():
+class TokenManager:
     """
-    使用 refresh_token 更新 access_token。
+    在記憶體中保存 Token，並由背景執行緒在 expires_at 前 refresh_margin 秒自動刷新。
+    取得 Token 不需讀檔；多個執行緒同時要求刷新時只會送出一次請求。
+    :param token_file: Token 檔路徑，只在啟動時讀取一次，刷新後以原子方式寫回
+    :param refresh_margin: 提前刷新的秒數
+    :param retry_delay: 背景刷新失敗後的重試間隔秒數
     """
-    try:
-        with open(TOKEN_FILE, "r") as f:
-            tokens = json.load(f)
-    except FileNotFoundError:
-        print("無法找到 tokens.json 文件，請先執行 authenticate_user")
-        exit(1)
 
-    refresh_token = tokens.get('refresh_token')
-    headers = {
-        'Authorization': f'Basic {base64.b64encode(bytes(f"{appKey}:{appSecret}", "utf-8")).decode("utf-8")}',
-        'Content-Type': 'application/x-www-form-urlencoded'
-    }
-    data = {
-        'grant_type': 'refresh_token',
-        'refresh_token': refresh_token
-    }
+    def __init__(self, token_file=TOKEN_FILE, refresh_margin=REFRESH_MARGIN_SECONDS, retry_delay=5):
+        self.token_file = token_file
+        self.refresh_margin = refresh_margin
+        self.retry_delay = retry_delay
 
-    response = requests.post('https://api.schwabapi.com/v1/oauth/token', headers=headers, data=data)
-    if response.status_code == 200:
-        new_tokens = response.json()
-        new_tokens['expires_at'] = (datetime.utcnow() + timedelta(seconds=new_tokens['expires_in'])).isoformat()
-        with open(TOKEN_FILE, "w") as f:
-            json.dump(new_tokens, f)
-        print("Access token 已更新並保存到 tokens.json")
-        return new_tokens['access_token']
-    else:
-        print("更新 access_token 失敗")
-        print(response.text)
-        exit(1)
+        self._tokens = None
+        self._expires_at = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
 
+    def load(self):
+        """
+        從 Token 檔讀入 Token，成功時返回 True。
+        """
+        try:
+            with open(self.token_file, "r") as f:
+                tokens = json.load(f)  # 嘗試讀取 JSON 文件
+        except FileNotFoundError:
+            log_to_file("無法找到 tokens.json 文件，請先執行 authenticate_user", "ERROR")
+            return False
+        except json.JSONDecodeError:
+            log_to_file("tokens.json 文件格式錯誤，請檢查文件內容或重新生成", "ERROR")
+            return False
 
-def get_valid_access_token():
-    """
-    檢查 Access Token 是否有效，若無效則使用 Refresh Token 更新。
-    """
-    try:
-        with open(TOKEN_FILE, "r") as f:
-            tokens = json.load(f)  # 嘗試讀取 JSON 文件
-    except FileNotFoundError:
-        log_to_file("無法找到 tokens.json 文件，請先執行 authenticate_user", "ERROR")
-        return None
-    except json.JSONDecodeError:
-        log_to_file("tokens.json 文件格式錯誤，請檢查文件內容或重新生成", "ERROR")
-        return None
-
-    # 檢查讀取結果是否為字典
-    if not isinstance(tokens, dict):
-        log_to_file("tokens.json 文件內容無效，應為字典格式。", "ERROR")
-        return None
-
-    expires_at = tokens.get('expires_at')
-    if expires_at and datetime.utcnow() < datetime.fromisoformat(expires_at):
-        # 如果 Access Token 還有效，直接返回
-        return tokens['access_token']
-    else:
+        # 檢查讀取結果是否為字典
+        if not isinstance(tokens, dict):
+            log_to_file("tokens.json 文件內容無效，應為字典格式。", "ERROR")
+            return False
+        self._set_tokens(tokens)
+        return True
+
+    def start(self):
+        """
+        啟動背景刷新執行緒。
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="token-refresh", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def get_access_token(self):
+        """
+        返回有效的 Access Token。正常情況下直接返回記憶體中的 Token，
+        只有在背景刷新未能及時完成、Token 已過期時才會同步刷新。
+        """
+        if self._tokens is None and not self.load():
+            return None
+        if not self._is_expired(0):
+            return self._tokens['access_token']
         log_to_file("Access Token 已過期，嘗試使用 Refresh Token 更新...")
-        new_access_token = refresh_access_token()  # 刷新 Access Token
+        new_access_token = self.refresh()
         if new_access_token:
             log_to_file("使用 Refresh Token 成功更新 Access Token。")
-            return new_access_token
         else:
             log_to_file("使用 Refresh Token 更新 Access Token 失敗，請檢查憑證或網絡連線。", "ERROR")
-            return None
+        return new_access_token
+
+    def refresh(self, force=False):
+        """
+        使用 refresh_token 更新 access_token，並發的呼叫只會送出一次請求。
+        :param force: 即使 Token 尚未接近過期也強制刷新
+        :return: 新的 access_token，失敗時返回 None
+        """
+        seen_expires_at = self._expires_at
+        with self._refresh_lock:
+            # 等待鎖的期間其他執行緒已刷新完成，直接使用其結果
+            if self._tokens is not None and self._expires_at != seen_expires_at and not self._is_expired(0):
+                return self._tokens['access_token']
+            if not force and self._tokens is not None and not self._is_expired(self.refresh_margin):
+                return self._tokens['access_token']
+            if self._tokens is None and not self.load():
+                return None
+
+            headers = {
+                'Authorization': _basic_auth_header(),
+                'Content-Type': 'application/x-www-form-urlencoded'
+            }
+            data = {
+                'grant_type': 'refresh_token',
+                'refresh_token': self._tokens.get('refresh_token')
+            }
+            try:
+                response = requests.post(TOKEN_URL, headers=headers, data=data, timeout=30)
+            except requests.exceptions.RequestException as e:
+                log_to_file(f"更新 access_token 時發生網路錯誤: {e}", "ERROR")
+                return None
+
+            if response.status_code != 200:
+                log_to_file(f"更新 access_token 失敗: {response.text}", "ERROR")
+                return None
+
+            try:
+                new_tokens = response.json()
+                access_token = new_tokens['access_token']
+                new_tokens['expires_at'] = (datetime.utcnow() + timedelta(seconds=new_tokens['expires_in'])).isoformat()
+            except (ValueError, KeyError, TypeError) as e:
+                log_to_file(f"更新 access_token 的回應格式錯誤: {e!r} {response.text[:200]}", "ERROR")
+                return None
+            # 回應中沒有新的 refresh_token 時沿用舊的
+            new_tokens.setdefault('refresh_token', self._tokens.get('refresh_token'))
+            try:
+                save_tokens(new_tokens, self.token_file)
+            except OSError as e:
+                log_to_file(f"Access Token 已更新但保存到 tokens.json 失敗: {e}", "ERROR")
+            self._set_tokens(new_tokens)
+            log_to_file("Access token 已更新並保存到 tokens.json")
+            return access_token
+
+    def _set_tokens(self, tokens):
+        expires_at = tokens.get('expires_at')
+        self._expires_at = datetime.fromisoformat(expires_at) if expires_at else None
+        self._tokens = tokens
+
+    def _is_expired(self, margin):
+        if self._expires_at is None:
+            return True
+        return datetime.utcnow() + timedelta(seconds=margin) >= self._expires_at
+
+    def _seconds_until_refresh(self):
+        if self._expires_at is None:
+            return 0
+        due = self._expires_at - timedelta(seconds=self.refresh_margin)
+        return max((due - datetime.utcnow()).total_seconds(), 0)
+
+    def _run(self):
+        delay = self.retry_delay
+        while not self._stop.wait(self._seconds_until_refresh()):
+            try:
+                refreshed = self.refresh()
+            except Exception as e:
+                log_to_file(f"背景刷新 access_token 時發生錯誤: {e!r}", "ERROR")
+                refreshed = None
+            if refreshed:
+                delay = self.retry_delay
+                continue
+            # 刷新失敗時以遞增的間隔重試，期間仍繼續使用現有 Token
+            if self._stop.wait(delay):
+                break
+            delay = min(delay * 2, 300)
+
+
+_token_manager = None
+_token_manager_lock = threading.Lock()
+
+
+def get_token_manager():
+    """
+    取得共用的 TokenManager，第一次呼叫時讀入 Token 並啟動背景刷新。
+    """
+    global _token_manager
+    with _token_manager_lock:
+        if _token_manager is None:
+            _token_manager = TokenManager()
+            if _token_manager.load():
+                _token_manager.start()
+        return _token_manager
+
+
+def refresh_access_token():
+    """
+    使用 refresh_token 更新 access_token。
+    """
+    new_access_token = get_token_manager().refresh(force=True)
+    if new_access_token is None:
+        print("更新 access_token 失敗")
+        exit(1)
+    return new_access_token
 
 
+def get_valid_access_token():
+    """
+    返回有效的 Access Token。Token 保存在記憶體中並於過期前在背景刷新，正常情況下不會讀檔或等待網路。
+    """
+    manager = get_token_manager()
+    access_token = manager.get_access_token()
+    if access_token:
+        manager.start()
+    return access_token
 
 
 if __name__ == "__main__":
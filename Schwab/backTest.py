@@ -1,9 +1,11 @@
 import requests
 import pandas as pd
 import os
-import yfinance as yf  # 使用 Yahoo Finance
 from dotenv import load_dotenv
 from datetime import timedelta
+from backtest_engine import BUY, run_backtest
+from backtest_metrics import compute_metrics, metrics_to_json
+from bar_store import BarStore, bars_to_frame
 
 # 載入環境變數
 load_dotenv()
@@ -14,25 +16,18 @@ BUY_AMOUNT = 200
 STOP_LOSS = 200  # 固定止損值
 
 # '1d', '5d', '1mo', '3mo', '6mo', '1y', '2y', '5y', '10y', 'ytd', 'max'
-def fetch_historical_data(symbol, period='5y'):
+def fetch_historical_data(symbol, period='5y', interval='1d', offline=False):
     """
-    使用 Yahoo Finance 獲取過去 n 年歷史數據
+    從本地 K 線庫讀取過去 n 年歷史數據，只向 Yahoo Finance 下載本地沒有的新 K 線
+    :param offline: 離線模式，只使用本地已保存的數據
     """
     try:
-        df = yf.download(symbol, period=period, interval='1d')
-        df.reset_index(inplace=True)
-        df.rename(columns={
-            'Date': 'Date',
-            'Open': 'Open',
-            'High': 'High',
-            'Low': 'Low',
-            'Close': 'Close',
-            'Volume': 'Volume'
-        }, inplace=True)
-        df.set_index('Date', inplace=True)
-        return df
+        bars = BarStore(offline=offline).get(symbol, interval=interval, period=period)
     except Exception as e:
         raise ValueError(f"無法獲取 {symbol} 的歷史數據: {e}")
+    if len(bars) == 0:
+        raise ValueError(f"無法獲取 {symbol} 的歷史數據: 本地沒有數據")
+    return bars_to_frame(bars)
 
 def calculate_annualized_return(initial_cash, final_cash, start_date, end_date):
     """
@@ -115,8 +110,9 @@ if __name__ == "__main__":
     data = fetch_historical_data(symbol)
     print("Successfully loaded historical data")
 
-    # 回測策略
-    trades, final_cash = backtest_strategy(data)
+    # 回測策略 (陣列版引擎，交易結果與 backtest_strategy 相同)
+    trades, final_cash = run_backtest(data['Close'].to_numpy(), INITIAL_CASH, BUY_AMOUNT, STOP_LOSS)
+    print(f"交易次數: 買入 {(trades['side'] == BUY).sum()} 次, 賣出 {(trades['side'] != BUY).sum()} 次")
 
     # 計算投資期間
     start_date = data.index.min()
@@ -129,4 +125,7 @@ if __name__ == "__main__":
     print(f"Final cash balance: ${final_cash:.2f}")
     print(f"總報酬率: {((final_cash - INITIAL_CASH) / INITIAL_CASH) * 100:.2f}%")
     print(f"年化報酬率: {annualized_return:.2f}%")
+    metrics = compute_metrics(data['Close'].to_numpy(), trades, INITIAL_CASH)
+    print(f"最大回撤: {metrics['max_drawdown'] * 100:.2f}%，Sharpe: {metrics['sharpe']:.2f}，勝率: {metrics['win_rate'] * 100:.1f}%")
+    print(metrics_to_json(metrics, symbol=symbol))
     print("Backtest completed.")
@@ -0,0 +1,85 @@
+import numpy as np
+
+INITIAL_CASH = 2000
+BUY_AMOUNT = 200
+STOP_LOSS = 200  # 固定止損值
+ADD_ON_MULTIPLIER = 1.05  # 價格達到上次買入價的倍數時加碼
+
+BUY = 1
+SELL = -1
+
+# 每筆交易一列：K 線索引、方向 (BUY/SELL)、成交價、成交後持倉 (賣出時為賣出前持倉)、成交後現金
+TRADE_DTYPE = np.dtype([
+    ('index', np.int64),
+    ('side', np.int8),
+    ('price', np.float64),
+    ('holdings', np.float64),
+    ('cash', np.float64),
+])
+
+
+def run_backtest(close, initial_cash=INITIAL_CASH, buy_amount=BUY_AMOUNT, stop_loss=STOP_LOSS,
+                 add_on_multiplier=ADD_ON_MULTIPLIER):
+    """
+    以連續的 NumPy 收盤價陣列執行與 backTest.backtest_strategy 相同的加碼/固定止損策略。
+    不建立 DataFrame 列物件也不輸出訊息，交易結果以 TRADE_DTYPE 結構化陣列返回。
+    :param close: 收盤價序列 (任何可轉為 float64 一維陣列的物件)
+    :return: (交易陣列, 最終現金)
+    """
+    prices = np.ascontiguousarray(close, dtype=np.float64).ravel()
+    trades = []
+    append = trades.append
+
+    cash = float(initial_cash)
+    holdings = 0.0
+    entry_price = 0.0
+    stop_loss_price = None
+    current_price = None
+
+    # tolist() 一次轉成 Python float，迴圈內不再存取 NumPy 純量
+    for i, current_price in enumerate(prices.tolist()):
+        # 初始買入條件
+        if holdings == 0 and cash >= buy_amount:
+            cash -= buy_amount
+            holdings += buy_amount / current_price
+            entry_price = current_price
+            stop_loss_price = entry_price - (stop_loss / holdings)
+            append((i, BUY, current_price, holdings, cash))
+            continue
+
+        # 止損檢查
+        if holdings > 0 and stop_loss_price and current_price <= stop_loss_price:
+            cash += holdings * current_price
+            append((i, SELL, current_price, holdings, cash))
+            holdings = 0
+            stop_loss_price = None
+
+        # 加碼檢查
+        if cash >= buy_amount:
+            base_price = entry_price if entry_price > 0 else current_price
+            if current_price >= base_price * add_on_multiplier:
+                cash -= buy_amount
+                holdings += buy_amount / current_price
+                entry_price = current_price
+                stop_loss_price = entry_price - (stop_loss / holdings)
+                append((i, BUY, current_price, holdings, cash))
+
+    # 最終平倉
+    if holdings > 0:
+        cash += holdings * current_price
+        append((len(prices) - 1, SELL, current_price, holdings, cash))
+
+    return np.array(trades, dtype=TRADE_DTYPE), cash
+
+
+def trades_to_records(trades, dates):
+    """
+    將交易陣列轉為 backtest_strategy 使用的字典列表格式。
+    :param dates: 與價格序列對應的日期索引
+    """
+    return [
+        {'Date': dates[index], 'Type': 'Buy' if side == BUY else 'Sell', 'Price': price, 'Holdings': holdings}
+        for index, side, price, holdings in zip(
+            trades['index'].tolist(), trades['side'].tolist(), trades['price'].tolist(), trades['holdings'].tolist()
+        )
+    ]
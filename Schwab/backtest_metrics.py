@@ -0,0 +1,159 @@
+import json
+
+import numpy as np
+
+from backtest_engine import BUY
+
+PERIODS_PER_YEAR = 252  # 日線的年化係數，分鐘線為 252 * 390
+EQUITY_METRICS = ("total_return", "annualized_return", "volatility", "sharpe", "sortino", "max_drawdown",
+                  "max_drawdown_duration")
+
+
+def _last_per_index(index, n):
+    """
+    返回每根 K 線對應的「最後一筆已發生交易」位置，尚未有交易時為 -1。
+    同一根 K 線有多筆交易時取最後一筆。
+    """
+    marker = np.full(n, -1, dtype=np.int64)
+    if len(index):
+        reversed_index = index[::-1]
+        unique_index, first_in_reversed = np.unique(reversed_index, return_index=True)
+        marker[unique_index] = len(index) - 1 - first_in_reversed
+    return np.maximum.accumulate(marker)
+
+
+def equity_curve(close, trades, initial_cash):
+    """
+    由收盤價與 backtest_engine 的交易陣列計算每根 K 線收盤時的帳戶淨值與持倉。
+    :return: (淨值陣列, 持倉陣列)
+    """
+    close = np.asarray(close, dtype=np.float64).ravel()
+    last = _last_per_index(trades['index'], len(close))
+    # 賣出紀錄的 holdings 為賣出前持倉，成交後持倉為 0
+    position_after = np.where(trades['side'] == BUY, trades['holdings'], 0.0)
+    has_trade = last >= 0
+    safe = np.where(has_trade, last, 0)
+    position = np.where(has_trade, position_after[safe] if len(trades) else 0.0, 0.0)
+    cash = np.where(has_trade, trades['cash'][safe] if len(trades) else initial_cash, float(initial_cash))
+    return cash + position * close, position
+
+
+def equity_metrics(equity, periods_per_year=PERIODS_PER_YEAR):
+    """
+    以向量運算計算淨值曲線的報酬、風險與回撤指標。
+    equity 可為一維 (單次回測) 或二維 (每列一次回測) 陣列，二維時一次算出所有回測的指標。
+    :return: 指標字典，二維輸入時每個值為陣列
+    """
+    equity = np.asarray(equity, dtype=np.float64)
+    if equity.shape[-1] == 0:
+        # 沒有任何 K 線時所有指標為 0
+        if equity.ndim == 1:
+            return {key: 0.0 for key in EQUITY_METRICS}
+        return {key: np.zeros(equity.shape[:-1]) for key in EQUITY_METRICS}
+    if equity.shape[-1] < 2:
+        # 只有一根 K 線時沒有報酬序列，視為報酬為 0
+        returns = np.zeros(equity.shape[:-1] + (1,))
+    else:
+        returns = np.diff(equity, axis=-1) / equity[..., :-1]
+    mean = returns.mean(axis=-1)
+    std = returns.std(axis=-1)
+    downside = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2, axis=-1))
+    scale = np.sqrt(periods_per_year)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(std > 0, mean / std * scale, 0.0)
+        sortino = np.where(downside > 0, mean / downside * scale, 0.0)
+
+    peak = np.maximum.accumulate(equity, axis=-1)
+    drawdown = equity / peak - 1.0
+    # 每根 K 線距離上一次創新高的 K 線數
+    bars = np.arange(equity.shape[-1])
+    peak_index = np.maximum.accumulate(np.where(equity >= peak, bars, 0), axis=-1)
+    underwater = bars - peak_index
+
+    periods = equity.shape[-1] - 1
+    total_return = equity[..., -1] / equity[..., 0] - 1.0
+    with np.errstate(invalid='ignore'):
+        annualized = np.where(periods > 0, (1.0 + total_return) ** (periods_per_year / max(periods, 1)) - 1.0, 0.0)
+    metrics = {
+        "total_return": total_return,
+        "annualized_return": annualized,
+        "volatility": std * scale,
+        "sharpe": sharpe,
+        "sortino": sortino,
+        "max_drawdown": drawdown.min(axis=-1),
+        "max_drawdown_duration": underwater.max(axis=-1),
+    }
+    if equity.ndim == 1:
+        return {key: value.item() for key, value in metrics.items()}
+    return metrics
+
+
+def trade_metrics(trades, initial_cash, bar_count):
+    """
+    由交易陣列計算每個持倉週期 (首次買入到賣出) 的勝率、平均持有 K 線數與週轉率。
+    """
+    if len(trades) == 0:
+        return {"round_trips": 0, "win_rate": 0.0, "average_holding_bars": 0.0, "traded_value": 0.0}
+    cash = trades['cash']
+    cash_change = np.diff(cash, prepend=float(initial_cash))
+    is_buy = trades['side'] == BUY
+    # 前一筆為賣出 (或第一筆) 的買入開啟新的持倉週期
+    opens = is_buy & np.concatenate(([True], ~is_buy[:-1]))
+    cycle = np.cumsum(opens) - 1
+    cycles = int(cycle[-1]) + 1
+    closed = np.zeros(cycles, dtype=bool)
+    closed[cycle[~is_buy]] = True
+
+    profit = np.bincount(cycle, weights=cash_change, minlength=cycles)[closed]
+    start = np.full(cycles, bar_count, dtype=np.int64)
+    np.minimum.at(start, cycle, trades['index'])
+    end = np.zeros(cycles, dtype=np.int64)
+    np.maximum.at(end, cycle, trades['index'])
+    holding = (end - start)[closed]
+    return {
+        "round_trips": int(closed.sum()),
+        "win_rate": float((profit > 0).mean()) if len(profit) else 0.0,
+        "average_holding_bars": float(holding.mean()) if len(holding) else 0.0,
+        "traded_value": float(np.abs(cash_change).sum()),
+    }
+
+
+def compute_metrics(close, trades, initial_cash, periods_per_year=PERIODS_PER_YEAR):
+    """
+    計算單次回測的完整指標：淨值曲線指標、勝率、平均持有時間、曝險比例與週轉率。
+    """
+    equity, position = equity_curve(close, trades, initial_cash)
+    return _add_trade_metrics(equity_metrics(equity, periods_per_year), equity, position, trades, initial_cash)
+
+
+def compute_metrics_batch(close, runs, periods_per_year=PERIODS_PER_YEAR):
+    """
+    計算同一組收盤價上多次回測的完整指標。所有淨值曲線疊成二維陣列後只呼叫一次 equity_metrics。
+    :param runs: (交易陣列, initial_cash) 列表
+    :return: 與 runs 順序相同的指標字典列表
+    """
+    if not runs:
+        return []
+    curves = [equity_curve(close, trades, initial_cash) for trades, initial_cash in runs]
+    batch = equity_metrics(np.stack([equity for equity, _ in curves]), periods_per_year)
+    return [
+        _add_trade_metrics({key: values[i].item() for key, values in batch.items()}, equity, position, trades,
+                           initial_cash)
+        for i, ((trades, initial_cash), (equity, position)) in enumerate(zip(runs, curves))
+    ]
+
+
+def _add_trade_metrics(metrics, equity, position, trades, initial_cash):
+    metrics.update(trade_metrics(trades, initial_cash, len(equity)))
+    metrics["exposure"] = float((position > 0).mean()) if len(position) else 0.0
+    traded_value = metrics.pop("traded_value")
+    metrics["turnover"] = traded_value / float(equity.mean()) if len(equity) else 0.0
+    metrics["final_equity"] = float(equity[-1]) if len(equity) else float(initial_cash)
+    return metrics
+
+
+def metrics_to_json(metrics, **extra):
+    """
+    將指標 (及額外欄位，例如股票代號與參數) 轉為 JSON 字串。
+    """
+    return json.dumps({**extra, **metrics}, ensure_ascii=False)
@@ -1,9 +1,9 @@
-import requests
 import time
 import os
 from tabulate import tabulate
-from datetime import datetime, timedelta
-from auth import get_valid_access_token, refresh_access_token
+from auth import get_valid_access_token
+from quote_client import get_quote_client
+from schwab_client import get_schwab_client
 
 
 def clear_console():
@@ -18,33 +18,26 @@ def clear_console():
         print("\n" * 100)
 
 
-def get_stock_price(api_key, symbol):
-    """
-    使用直接 HTTP 請求調用 Finnhub API 獲取即時股票價格
-    """
-    url = f"https://finnhub.io/api/v1/quote?symbol={symbol}&token={api_key}"
-    try:
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
-        return data.get("c")  # 即時價格字段 "c"
-    except requests.exceptions.RequestException as e:
-        print(f"查詢 {symbol} 價格時發生錯誤: {e}")
-        return None
-
-
 def display_positions_with_prices(base_url, headers, finnhub_api_key):
     """
     查詢帳戶持倉及股票當前價格，計算總市值和每隻股票的獲利百分比，並以表格形式輸出
     """
     params = {'fields': 'positions'}
-    response = requests.get(f'{base_url}/accounts', headers=headers, params=params)
+    response = get_schwab_client(base_url).get('accounts', headers=headers, params=params, endpoint="accounts")
 
     if response.status_code == 200:
         accounts_data = response.json()
         total_market_value = 0  # 初始化總市值
         account_results = []  # 暫存每個帳戶的總市值資訊
 
+        # 先收集所有帳戶的持倉股票，一次並發查詢即時價格
+        all_symbols = [
+            position['instrument'].get('symbol')
+            for account in accounts_data
+            for position in account.get('securitiesAccount', {}).get('positions', [])
+        ]
+        prices = get_quote_client(finnhub_api_key).get_quotes(all_symbols)
+
         for account in accounts_data:
             account_info = account.get('securitiesAccount', {})
             account_number = account_info.get('accountNumber', '未知帳號')
@@ -62,7 +55,7 @@ def display_positions_with_prices(base_url, headers, finnhub_api_key):
                     symbol = position['instrument'].get('symbol', '未知股票')
                     quantity = position.get('longQuantity', 0.0)
                     cost_price = position.get('averagePrice', 0.0)  # 持倉的平均成本價
-                    current_price = get_stock_price(finnhub_api_key, symbol)
+                    current_price = prices.get(symbol)
 
                     if current_price is not None:
                         current_market_value = quantity * current_price
@@ -117,23 +110,14 @@ if __name__ == "__main__":
         exit(1)
 
     base_url = "https://api.schwabapi.com/trader/v1/"
-    access_token = get_valid_access_token()  # 使用原本的方式獲取 Access Token
-    headers = {'Authorization': f'Bearer {access_token}'}
-    token_expiry = datetime.now() + timedelta(minutes=30)  # 假設 Token 有效期為 30 分鐘
-
     try:
         while True:
-            # 如果 Token 即將過期，刷新 Token
-            if datetime.now() >= token_expiry:
-                print("Access Token 即將過期，正在刷新...")
-                access_token = get_valid_access_token()  # 重新調用你的函數
-                if access_token:
-                    headers = {'Authorization': f'Bearer {access_token}'}
-                    token_expiry = datetime.now() + timedelta(minutes=30)
-                    print("Access Token 刷新成功。")
-                else:
-                    print("刷新 Access Token 失敗，請檢查憑證或網絡連線。")
-                    break
+            # Token 由背景執行緒在過期前刷新，這裡只取用記憶體中的最新 Token
+            access_token = get_valid_access_token()
+            if not access_token:
+                print("刷新 Access Token 失敗，請檢查憑證或網絡連線。")
+                break
+            headers = {'Authorization': f'Bearer {access_token}'}
 
             # 執行查詢和更新
             print("更新持倉及當前股價中...")
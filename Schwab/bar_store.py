@@ -0,0 +1,191 @@
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+BAR_DIR = "bar_data"
+
+# 每根 K 線一列：UTC epoch 秒、開高低收、成交量
+BAR_DTYPE = np.dtype([
+    ('time', np.int64),
+    ('open', np.float64),
+    ('high', np.float64),
+    ('low', np.float64),
+    ('close', np.float64),
+    ('volume', np.int64),
+])
+
+_PERIOD_UNITS = {"d": "days", "wk": "weeks", "mo": "months", "y": "years"}
+
+
+def period_start(period, now=None):
+    """
+    將 yfinance 的 period 字串 ('5d', '1mo', '5y', 'ytd', 'max') 轉為起始時間 (UTC epoch 秒)，'max' 返回 None。
+    """
+    now = pd.Timestamp(now or time.time(), unit='s', tz='UTC')
+    if period == "max":
+        return None
+    if period == "ytd":
+        return int(pd.Timestamp(year=now.year, month=1, day=1, tz='UTC').timestamp())
+    for suffix, unit in _PERIOD_UNITS.items():
+        if period.endswith(suffix) and period[:-len(suffix)].isdigit():
+            return int((now - pd.DateOffset(**{unit: int(period[:-len(suffix)])})).timestamp())
+    raise ValueError(f"無法識別的期間: {period}")
+
+
+def frame_to_bars(df):
+    """
+    將 yfinance 下載的 DataFrame 轉為 BAR_DTYPE 陣列。
+    """
+    if df is None or df.empty:
+        return np.empty(0, dtype=BAR_DTYPE)
+    if isinstance(df.columns, pd.MultiIndex):
+        df = df.copy()
+        df.columns = df.columns.get_level_values(0)
+    index = pd.DatetimeIndex(df.index)
+    index = index.tz_localize('UTC') if index.tz is None else index.tz_convert('UTC')
+
+    bars = np.empty(len(df), dtype=BAR_DTYPE)
+    bars['time'] = (index - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)
+    for field, column in (('open', 'Open'), ('high', 'High'), ('low', 'Low'), ('close', 'Close')):
+        bars[field] = df[column].to_numpy(dtype=np.float64)
+    bars['volume'] = df['Volume'].fillna(0).to_numpy(dtype=np.int64) if 'Volume' in df else 0
+    return bars
+
+
+def bars_to_frame(bars):
+    """
+    將 K 線陣列轉為與舊版 fetch_historical_data 相同格式的 DataFrame (以 Date 為索引)。
+    """
+    index = pd.to_datetime(np.asarray(bars['time']), unit='s', utc=True).tz_localize(None)
+    return pd.DataFrame({
+        'Open': bars['open'],
+        'High': bars['high'],
+        'Low': bars['low'],
+        'Close': bars['close'],
+        'Volume': bars['volume'],
+    }, index=pd.Index(index, name='Date'))
+
+
+class BarStore:
+    """
+    本地歷史 K 線庫。每檔股票每種週期存成一個結構化 .npy 檔，以記憶體映射方式讀取，
+    開啟大量股票時只建立映射、不讀入整個檔案。更新時只向 yfinance 下載比本地最新一根更新的 K 線。
+    :param root: 資料目錄
+    :param offline: 離線模式，只讀取本地資料，不連線下載
+    :param max_age: 距離上次更新未滿此秒數時不重新下載
+    """
+
+    def __init__(self, root=BAR_DIR, offline=False, max_age=900):
+        self.root = root
+        self.offline = offline
+        self.max_age = max_age
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, symbol, interval="1d"):
+        return os.path.join(self.root, f"{symbol.upper()}_{interval}.npy")
+
+    def load(self, symbol, interval="1d"):
+        """
+        以記憶體映射讀取本地 K 線，沒有資料時返回空陣列。
+        """
+        path = self.path(symbol, interval)
+        if not os.path.exists(path):
+            return np.empty(0, dtype=BAR_DTYPE)
+        return np.load(path, mmap_mode='r')
+
+    def get(self, symbol, interval="1d", period="5y"):
+        """
+        返回指定期間的 K 線，需要時先增量更新本地資料。
+        """
+        if not self.offline:
+            self.update(symbol, interval, period)
+        bars = self.load(symbol, interval)
+        start = period_start(period)
+        if start is not None and len(bars):
+            bars = bars[np.searchsorted(bars['time'], start):]
+        return bars
+
+    def update(self, symbol, interval="1d", period="5y"):
+        """
+        下載本地沒有的 K 線並寫回檔案，返回新增的 K 線數量。
+        本地資料的起點晚於要求期間時重新下載整個期間。
+        下載失敗或沒有資料時不更新 meta，下次呼叫會重新嘗試。
+        """
+        meta = self._read_meta(symbol, interval)
+        start = period_start(period)
+        covered_from = meta.get("covered_from")
+        covers_period = covered_from is not None and (start is None and covered_from == 0 or
+                                                      start is not None and covered_from <= start)
+        if covers_period and time.time() - meta.get("updated", 0) < self.max_age:
+            return 0
+
+        existing = self.load(symbol, interval)
+        if covers_period and len(existing):
+            # 最後一根 K 線可能尚未收盤，從它開始重新下載並覆蓋
+            last_time = int(existing['time'][-1])
+            new_bars = self._download(symbol, interval, start=last_time)
+            kept = np.array(existing[existing['time'] < (new_bars['time'][0] if len(new_bars) else last_time + 1)])
+            added = len(new_bars) - int(len(existing) - len(kept))
+        else:
+            new_bars = self._download(symbol, interval, period=period)
+            kept = np.empty(0, dtype=BAR_DTYPE)
+            covered_from = 0 if start is None else start
+            added = len(new_bars) - len(existing)
+        del existing
+
+        if not len(new_bars):
+            # 增量下載至少會包含最後一根 K 線，沒有資料表示下載失敗，保留原本的資料與 meta
+            print(f"下載 {symbol} {interval} K 線失敗或沒有資料，沿用本地資料。")
+            return 0
+
+        bars = np.concatenate([kept, new_bars]) if len(kept) else new_bars
+        self._write(self.path(symbol, interval), bars)
+        self._write_meta(symbol, interval, {"covered_from": covered_from, "updated": time.time()})
+        return max(added, 0)
+
+    def _download(self, symbol, interval, start=None, period=None):
+        import yfinance as yf
+
+        if start is not None:
+            df = yf.download(symbol, start=pd.Timestamp(start, unit='s', tz='UTC').strftime("%Y-%m-%d"),
+                             interval=interval, progress=False)
+            bars = frame_to_bars(df)
+            return bars[bars['time'] >= start]
+        return frame_to_bars(yf.download(symbol, period=period, interval=interval, progress=False))
+
+    def _write(self, path, bars):
+        """
+        先寫入同目錄的暫存檔再原子性替換，避免讀取端看到寫到一半的檔案。
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.ascontiguousarray(bars, dtype=BAR_DTYPE))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _meta_path(self, symbol, interval):
+        return self.path(symbol, interval)[:-len(".npy")] + ".json"
+
+    def _read_meta(self, symbol, interval):
+        try:
+            with open(self._meta_path(symbol, interval), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_meta(self, symbol, interval, meta):
+        path = self._meta_path(symbol, interval)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, path)
@@ -1,21 +1,30 @@
 import requests
 import time  # 修復 NameError
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import os
 from datetime import datetime, timedelta, timezone
 from auth import get_valid_access_token
 from order import get_account_hash
+from order_manager import CANCELED_STATUSES, FILLED_STATUSES
+from schwab_client import get_schwab_client
 
 # 加載 .env 配置
 load_dotenv()
 
 # 配置常量
 BASE_URL = "https://api.schwabapi.com/trader/v1/"
+TERMINAL_STATUSES = FILLED_STATUSES + CANCELED_STATUSES
+IN_PROGRESS_STATUSES = ("PENDING_CANCEL",)  # 交易所已收到取消請求、尚未完成
+CANCEL_WORKERS = 10  # 同時送出取消請求的執行緒數，實際速率由 SchwabClient 的令牌桶限制
+CONFIRM_DELAY = 0.5  # 送出取消後第一次確認前的等待秒數，之後逐次加倍
+CONFIRM_TIMEOUT = 8  # 每輪等待訂單進入終止狀態的最長秒數
 
 
-def get_all_orders(base_url, headers, account_hash, days=3):
+def get_all_orders(base_url, headers, account_hash, days=3, verbose=True):
     """
     查詢帳戶中所有目前的訂單，包含必需的查詢參數
+    :param verbose: 是否輸出查詢到的訂單數量，查詢失敗時一律輸出
     """
     now = datetime.now(timezone.utc)
     from_time = now - timedelta(days=days)
@@ -23,7 +32,6 @@ def get_all_orders(base_url, headers, account_hash, days=3):
     from_time_str = from_time.strftime("%Y-%m-%dT%H:%M:%SZ")
     to_time_str = now.strftime("%Y-%m-%dT%H:%M:%SZ")
 
-    url = f"{base_url.rstrip('/')}/accounts/{account_hash}/orders"
     params = {
         "fromEnteredTime": from_time_str,
         "toEnteredTime": to_time_str
@@ -32,14 +40,18 @@ def get_all_orders(base_url, headers, account_hash, days=3):
     # print(f"查詢參數: {params}")
     # print(f"Headers: {headers}")
 
-    response = requests.get(url, headers=headers, params=params)
+    try:
+        response = get_schwab_client(base_url).get(
+            f"accounts/{account_hash}/orders", headers=headers, params=params, endpoint="orders"
+        )
+    except requests.exceptions.RequestException as e:
+        print(f"查詢訂單失敗: {e}")
+        return None
     if response.status_code == 200:
         orders = response.json()
-        if not orders:
-            print("目前無任何訂單。")
-            return []
-        print(f"成功查詢到 {len(orders)} 筆訂單。")
-        return orders
+        if verbose:
+            print(f"成功查詢到 {len(orders)} 筆訂單。" if orders else "目前無任何訂單。")
+        return orders or []
     else:
         print(f"查詢訂單失敗，HTTP 狀態碼: {response.status_code}")
         print(f"響應內容: {response.text}")
@@ -50,11 +62,13 @@ def cancel_order(base_url, headers, account_hash, order_id):
     """
     取消指定帳戶中的特定訂單
     """
-    url = f"{base_url.rstrip('/')}/accounts/{account_hash}/orders/{order_id}"
-    # print(f"取消訂單 URL: {url}")
-    # print(f"Headers: {headers}")
-
-    response = requests.delete(url, headers=headers)
+    try:
+        response = get_schwab_client(base_url).delete(
+            f"accounts/{account_hash}/orders/{order_id}", headers=headers, endpoint="cancel_order"
+        )
+    except requests.exceptions.RequestException as e:
+        print(f"取消訂單 {order_id} 失敗: {e}")
+        return False
     if response.status_code == 200:
         print(f"訂單 {order_id} 已成功取消。")
         return True
@@ -64,50 +78,96 @@ def cancel_order(base_url, headers, account_hash, order_id):
         return False
 
 
-def cancel_all_orders(base_url, headers, account_hash, limit=50):
+def confirm_orders(base_url, headers, account_hash, order_ids, delay=CONFIRM_DELAY, timeout=CONFIRM_TIMEOUT):
+    """
+    以逐次加倍的間隔重新查詢訂單，直到全部進入終止狀態或逾時。
+    :return: (已終止, 仍在取消中 (PENDING_CANCEL), 未終止) 三個訂單 ID 列表
+    """
+    deadline = time.monotonic() + timeout
+    terminal = []
+    remaining = list(order_ids)
+    statuses = {}
+    while remaining:
+        time.sleep(max(min(delay, deadline - time.monotonic()), 0))
+        latest = get_all_orders(base_url, headers, account_hash, verbose=False)
+        if latest is not None:
+            statuses = {order.get("orderId"): order.get("status") for order in latest}
+            terminal.extend(order_id for order_id in remaining if statuses.get(order_id) in TERMINAL_STATUSES)
+            remaining = [order_id for order_id in remaining if statuses.get(order_id) not in TERMINAL_STATUSES]
+        if time.monotonic() >= deadline:
+            break
+        delay *= 2
+
+    in_progress = [order_id for order_id in remaining if statuses.get(order_id) in IN_PROGRESS_STATUSES]
+    not_terminal = [order_id for order_id in remaining if statuses.get(order_id) not in IN_PROGRESS_STATUSES]
+    return terminal, in_progress, not_terminal
+
+
+def cancel_all_orders(base_url, headers, account_hash, limit=50, max_workers=CANCEL_WORKERS, max_rounds=3,
+                      confirm_delay=CONFIRM_DELAY, confirm_timeout=CONFIRM_TIMEOUT):
     """
-    取消所有目前的訂單，加入狀態檢查和限量
+    並行取消所有目前的訂單，加入狀態檢查和限量。
+    請求速率由共用 SchwabClient 的令牌桶限制在 API 上限內，不再每筆固定等待 1 秒。
+    每輪取消後以退避間隔重新查詢，確認訂單進入終止狀態；PENDING_CANCEL 視為取消處理中，
+    只繼續確認不重送，其餘仍未終止的訂單在下一輪重試，最多 max_rounds 輪。
+    :param limit: 本次最多取消的訂單數量
+    :param max_workers: 同時送出取消請求的執行緒數
+    :param max_rounds: 取消並確認的最大輪數
+    :param confirm_delay: 每輪第一次確認前的等待秒數
+    :param confirm_timeout: 每輪等待確認的最長秒數
+    :return: 結果字典 (canceled, in_progress, failed, elapsed)，無法獲取訂單時返回 None
     """
+    started = time.monotonic()
     orders = get_all_orders(base_url, headers, account_hash)
     if orders is None:
         print("未能成功獲取訂單，無法進行取消操作。")
-        return
-
-    canceled_orders = []
-    failed_orders = []
-    count = 0
+        return None
 
+    pending = []
     for order in orders:
-        if count >= limit:  # 限制取消的訂單數量
-            print(f"已達到本次執行的取消限制數量：{limit}")
-            break
-
         order_id = order.get("orderId")
         order_status = order.get("status")
 
         # 跳過無法取消的訂單
-        if order_status in ["CANCELED", "REJECTED", "FILLED", "REPLACED", "EXPIRED"]:
+        if order_status in TERMINAL_STATUSES:
             print(f"跳過訂單 {order_id}，狀態為: {order_status}")
             continue
+        if len(pending) >= limit:  # 限制取消的訂單數量
+            print(f"已達到本次執行的取消限制數量：{limit}")
+            break
+        pending.append(order_id)
 
-        print(f"正在取消訂單 ID: {order_id}，狀態: {order_status}")
-        if cancel_order(base_url, headers, account_hash, order_id):
-            canceled_orders.append(order_id)
-        else:
-            failed_orders.append(order_id)
-
-        count += 1
-        time.sleep(1)  # 增加延遲，避免請求過於頻繁
+    canceled_orders = []
+    in_progress = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for round_number in range(1, max_rounds + 1):
+            if not pending and not in_progress:
+                break
+            if pending:
+                print(f"第 {round_number} 輪：正在取消 {len(pending)} 筆訂單...")
+                list(executor.map(lambda order_id: cancel_order(base_url, headers, account_hash, order_id),
+                                  pending))
+
+            # 取消需要時間生效，等待後再確認；取消請求成功但仍未終止的訂單在下一輪重試
+            terminal, in_progress, pending = confirm_orders(base_url, headers, account_hash, pending + in_progress,
+                                                            confirm_delay, confirm_timeout)
+            canceled_orders.extend(terminal)
+
+    failed_orders = pending
+    elapsed = time.monotonic() - started
 
     # 報告結果
     print("\n取消操作完成。")
-    print(f"成功取消的訂單數量: {len(canceled_orders)}")
+    print(f"已確認終止的訂單數量: {len(canceled_orders)}")
+    print(f"取消處理中的訂單數量: {len(in_progress)}")
     print(f"失敗的訂單數量: {len(failed_orders)}")
+    print(f"總耗時: {elapsed:.2f} 秒")
 
     if failed_orders:
         print("以下訂單無法取消:")
         for order_id in failed_orders:
             print(f" - 訂單 ID: {order_id}")
+    return {"canceled": canceled_orders, "in_progress": in_progress, "failed": failed_orders, "elapsed": elapsed}
 
 
 if __name__ == "__main__":
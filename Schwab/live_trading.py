@@ -1,14 +1,20 @@
-import requests
 import time
 import math
 import os
-import json
+import threading
 
-from datetime import datetime, timedelta
+from datetime import datetime
 from dotenv import load_dotenv
 # 模擬交易相關
 from auth import get_valid_access_token
+from trade_logger import log_to_file
 from order import place_order, get_account_hash
+from order_manager import OrderManager
+from account_cache import AccountSnapshotCache, fetch_account_snapshot, quote_positions
+from quote_client import get_quote_client
+from market_schedule import seconds_until_open
+from symbol_monitor import SymbolMonitor
+from tick_recorder import get_tick_recorder
 
 # 加載環境變量
 load_dotenv()
@@ -24,7 +30,6 @@ BUY_AMOUNT = 200
 STOP_LOSS = 200
 MAX_TRADES = 3  # 最大交易次數
 SIMULATED = False  # 模擬交易開關
-TOKEN_FILE = "tokens.json"
 
 
 BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
@@ -34,115 +39,33 @@ if not BOT_TOKEN or not CHAT_ID:
 
 # 初始化交易次數
 trade_count = 0
-# 初始化 Token 過期時間
-token_expiry = datetime.now() + timedelta(minutes=30)
 last_add_price = 0  # 記錄最後一次加碼時的價格
 last_order_time = datetime.min  # 初始化為最小時間
 cooldown_seconds = 60  # 設置冷卻時間為 60 秒
+ACCOUNT_SNAPSHOT_TTL = 3600  # 沒有下單活動時帳戶快照的有效秒數
+MARKET_HOURS_ONLY = True  # 休市期間 (夜間、週末、假日) 暫停監控
+ORDER_POLL_INTERVAL = 5  # 有未完成訂單時查詢訂單狀態的間隔秒數
+RECORD_TICKS = True  # 將查詢到的報價寫入 tick_data/ 供回放與分析
 
 
 
-def log_to_file(message, log_type="INFO"):
+def get_stock_price(api_key, symbol):
     """
-    改進的日誌記錄函數。
-    :param message: 日誌消息
-    :param log_type: 日誌類型，例如 "INFO", "ERROR", "TRADE"
+    使用 Finnhub API 獲取即時股票價格，透過共用的 QuoteClient 連線池查詢。
     """
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    formatted_message = f"[{timestamp}] [{log_type}] {message}"
-    with open("trade_log.txt", "a") as log_file:
-        log_file.write(formatted_message + "\n")
-    print(formatted_message)
+    return get_quote_client(api_key).get_quote(symbol)
 
-def get_stock_price(api_key, symbol, retries=3):
-    """
-    使用 Finnhub API 獲取即時股票價格，支持重試機制。
-    """
-    url = f"https://finnhub.io/api/v1/quote?symbol={symbol}&token={api_key}"
-    for attempt in range(retries):
-        try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            return data.get("c")  # 即時價格字段 "c"
-        except requests.exceptions.Timeout:
-            # 如果超過 10 秒都沒回應，就抓到 Timeout
-            log_to_file(f"{symbol} 價格查詢第 {attempt + 1} 次超時，重試中...")
-            if attempt < retries - 1:
-                time.sleep(2)  # 等待 2 秒後重試
-            else:
-                log_to_file(f"多次重試仍超時，無法獲取 {symbol} 的價格。", "ERROR")
-                return None
-        except requests.exceptions.RequestException as e:
-            log_to_file(f"查詢 {symbol} 價格時發生錯誤: {e}")
-            if attempt < retries - 1:
-                log_to_file(f"重試第 {attempt + 1} 次...")
-                time.sleep(2)
-            else:
-                log_to_file(f"多次重試失敗，無法獲取 {symbol} 的價格。", "ERROR")
-                return None
-
-def get_positions_and_cash(BASE_URL, headers, finnhub_api_key):
+def get_positions_and_cash(BASE_URL, headers, finnhub_api_key, symbols=None):
     """
     查詢帳戶持倉及現金餘額，返回結構化數據供交易策略使用。
+    :param symbols: 只查詢這些股票的即時價格，None 表示查詢全部持倉
     """
-    # log_to_file("進入 get_positions_and_cash 函式...")
-    try:
-
-        params = {'fields': 'positions'}
-        # log_to_file("準備呼叫 /accounts API...")
-
-        response = requests.get(f'{BASE_URL}/accounts', headers=headers, params=params, timeout=10)
-        log_to_file(f"/accounts API 回應結束, status_code={response.status_code}")
-
-
-        if response.status_code == 200:
-            accounts_data = response.json()
-            total_cash_balance = 0.0
-            holdings = []
-
-            for account in accounts_data:
-                account_info = account.get('securitiesAccount', {})
-                cash_balance = account_info.get('currentBalances', {}).get('cashBalance', 0.0)
-                total_cash_balance += cash_balance
-
-                positions = account_info.get('positions', [])
-                for position in positions:
-                    symbol = position['instrument'].get('symbol', None)
-                    quantity = position.get('longQuantity', 0.0)
-                    average_price = position.get('averagePrice', 0.0)
-
-                    # 查詢價格前再記錄一下
-                    # log_to_file(f"查詢 {symbol} 即時價格前...")
-                    current_price = get_stock_price(finnhub_api_key, symbol)
-                    # log_to_file(f"{symbol} 即時價格查詢完成: {current_price}")
-
-
-                    if current_price is not None and average_price > 0:
-                        profit_percent = ((current_price - average_price) / average_price * 100)
-                    else:
-                        profit_percent = None
-
-                    if symbol and quantity > 0:
-                        holdings.append({
-                            "symbol": symbol,
-                            "quantity": quantity,
-                            "average_price": average_price,
-                            "current_price": current_price,
-                            "market_value": quantity * current_price if current_price else 0.0,
-                            "profit_percent": profit_percent
-                        })
-            log_to_file(f"成功獲取帳戶數據: 現金餘額 ${total_cash_balance:.2f}")
-            return total_cash_balance, holdings
-        else:
-            log_to_file(f"查詢帳戶及持倉失敗，錯誤代碼: {response.status_code}, 錯誤信息: {response.text}", "ERROR")
-            return 0.0, []
-    except requests.exceptions.Timeout:
-        log_to_file("查詢帳戶及持倉時超時，請檢查 API 或網路環境。", "ERROR")
-        return 0.0, []
-    except Exception as e:
-        log_to_file(f"get_positions_and_cash 遇到未預期錯誤: {e}", "ERROR")
+    snapshot = fetch_account_snapshot(BASE_URL, headers)
+    if snapshot is None:
         return 0.0, []
+    total_cash_balance, positions = snapshot
+    log_to_file(f"成功獲取帳戶數據: 現金餘額 ${total_cash_balance:.2f}")
+    return total_cash_balance, quote_positions(finnhub_api_key, positions, symbols)
 
 # def place_order_simulated(BASE_URL, headers, account_hash, symbol, quantity, price):
 #     """模擬下單功能，用於測試環境。"""
@@ -167,127 +90,71 @@ def live_trade_strategy(BASE_URL, headers, account_hash, finnhub_api_key, symbol
     """
     單一股票的實時交易策略
     """
-    global last_order_time  # 聲明全局變量
-
     log_to_file(f"開始監控股票: {symbol}")
-    highest_price = 0
-    stop_loss_price = 0
-    dynamic_stop_loss_pct = 0.05  # 動態回撤比例 (5%)
-    minimum_profit_threshold = 0.02  # 最小盈利門檻 (2%)
-    use_moving_stop_loss = False
-
-    # 用來檢查價格是否未變動
-    previous_prices = []  # 保存最近 3 次價格
+    if RECORD_TICKS:
+        get_quote_client(finnhub_api_key).recorder = get_tick_recorder()
+    monitor = SymbolMonitor(symbol, buy_amount=BUY_AMOUNT, stop_loss=STOP_LOSS, cooldown_seconds=cooldown_seconds)
+    account_cache = AccountSnapshotCache(BASE_URL, headers, ttl=ACCOUNT_SNAPSHOT_TTL)
+    order_filled = threading.Event()
+
+    def on_fill(order):
+        # 成交後持倉已改變，立即重新查詢帳戶並提前進行下一次檢查
+        account_cache.invalidate()
+        order_filled.set()
+
+    order_manager = OrderManager(BASE_URL, headers, account_hash, poll_interval=ORDER_POLL_INTERVAL,
+                                 on_fill=on_fill, on_partial_fill=on_fill)
+
+    def submit_order(order_symbol, quantity, price, action):
+        result = order_manager.place_order(order_symbol, quantity, price, action)
+        # 下單後持倉可能改變，讓帳戶快照重新查詢
+        account_cache.invalidate()
+        return result
+
+    order_manager.start()
     try:
         while True:
-            log_to_file("準備呼叫 refresh_access_token_periodically...")
+            # 休市期間不查詢帳戶、報價與刷新 Token，直接等到開盤
+            wait = seconds_until_open() if MARKET_HOURS_ONLY else 0
+            if wait > 0:
+                log_to_file(f"美股休市中，{wait / 3600:.1f} 小時後開盤，暫停監控。")
+                time.sleep(wait)
+                continue
+
+            log_to_file("準備呼叫 refresh_access_token_periodically...", "DEBUG")
             # **刷新 Token**
             refresh_access_token_periodically(headers)
-            log_to_file("refresh_access_token_periodically 完成")
+            log_to_file("refresh_access_token_periodically 完成", "DEBUG")
 
             # 在呼叫前
-            log_to_file("準備呼叫 get_positions_and_cash...")
+            log_to_file("準備呼叫 get_positions_and_cash...", "DEBUG")
             # 獲取現金與持倉數據
-            cash, holdings = get_positions_and_cash(BASE_URL, headers, finnhub_api_key)
+            cash, holdings = account_cache.get_positions_and_cash(finnhub_api_key, symbols=[symbol])
             # 呼叫後
-            log_to_file(f"get_positions_and_cash 完成, 現金餘額={cash}")
+            log_to_file(f"get_positions_and_cash 完成, 現金餘額={cash}", "DEBUG")
 
             # 找到目標股票的持倉
             symbol_holdings = next((h for h in holdings if h['symbol'].lower() == symbol.lower()), None)
-            if not symbol_holdings:
-                log_to_file(f"未找到 {symbol} 的持倉數據，跳過此次檢查。")
-                time.sleep(30)
-                continue
-
-            # 提取持倉數據
-            quantity = symbol_holdings['quantity']
-            entry_price = symbol_holdings['average_price']
-            # 設置加碼目標價格和止損條件
-            target_add_price = entry_price * 1.1  # 5% 加碼
-
-            # 判斷是否啟用移動止損
-            if quantity * entry_price > 2 * BUY_AMOUNT:
-                use_moving_stop_loss = True
-                log_to_file(f"持倉成本超過兩次交易金額，切換至移動止損模式。")
-            else:
-                use_moving_stop_loss = False
-                log_to_file(f"仍使用固定止損模式。")
-
-            log_to_file(f"準備呼叫 get_stock_price for {symbol}...")
-            # 獲取當前股票價格
-            current_price = get_stock_price(finnhub_api_key, symbol)
-            if current_price is None:
-                log_to_file(f"無法獲取 {symbol} 的即時價格，跳過此次檢查。")
-                time.sleep(30)
-                continue
-            log_to_file(f"get_stock_price 完成, current_price={current_price}")
-
-            # **檢查價格是否未變動 3 次**
-            previous_prices.append(current_price)
-            if len(previous_prices) > 3:
-                previous_prices.pop(0)
-            if len(set(previous_prices)) == 1:  # 如果最近 3 次價格相同
-                log_to_file(f"{symbol} 價格連續 3 次未變動，跳過此次檢查。")
-                time.sleep(5)
-                continue
-
-            log_to_file(f"持倉數量: {quantity}, 平均成本: ${entry_price:.2f}")
-            log_to_file(f"{symbol} 當前價格: ${current_price:.2f}")
-            log_to_file(f"加碼目標價格: ${target_add_price:.2f}")
-
-            # 更新移動止損
-            if use_moving_stop_loss:
-                if current_price > highest_price:
-                    highest_price = current_price
-                    stop_loss_price = max(
-                        highest_price * (1 - dynamic_stop_loss_pct),  # 最高價回撤比例
-                        entry_price * (1 + minimum_profit_threshold)  # 保證最低盈利
-                    )
-                    log_to_file(f"新高價: ${highest_price:.2f}，更新移動止損點: ${stop_loss_price:.2f}")
-                else:
-                    log_to_file(f"當前價格未創新高，移動止損點保持為: ${stop_loss_price:.2f}")
-            else:
-                # 固定止損邏輯
-                stop_loss_price = entry_price - (STOP_LOSS / quantity)
-                log_to_file(f"固定止損點: ${stop_loss_price:.2f}")
-
-            # 判斷止損條件
-            if current_price <= stop_loss_price:
-                log_to_file(f"觸發止損條件，賣出持倉: {symbol}")
-                result = place_order(BASE_URL, headers, account_hash, symbol, quantity, current_price,
-                                     action="SELL")
-                if result.get("status") == "success":
-                    log_to_file(f"止損成功，賣出 {quantity} 股 {symbol} @ ${current_price:.2f}")
-                else:
-                    log_to_file(f"止損失敗: {result.get('error')}", "ERROR")
+            current_price = None
+            if symbol_holdings:
+                log_to_file(f"準備呼叫 get_stock_price for {symbol}...", "DEBUG")
+                # 獲取當前股票價格
+                current_price = get_stock_price(finnhub_api_key, symbol)
+                log_to_file(f"get_stock_price 完成, current_price={current_price}", "DEBUG")
+
+            delay = monitor.step(symbol_holdings, current_price, submit_order)
+            if delay is None:
                 break
 
-            # **判斷加碼條件**
-            if current_price >= target_add_price and (datetime.now() - last_order_time).seconds > cooldown_seconds:
-                log_to_file(f"觸發加碼條件，嘗試買入: {symbol}")
-                shares_to_buy = math.ceil(BUY_AMOUNT / current_price)
-                result = place_order(BASE_URL, headers, account_hash, symbol, shares_to_buy, current_price,
-                                     action="BUY")
-                if result.get("status") == "success":
-                    log_to_file(f"加碼成功，買入 {shares_to_buy} 股 {symbol} @ ${current_price:.2f}")
-                    last_order_time = datetime.now()
-                    # 更新平均成本與止損點
-                    total_cost = (quantity * entry_price) + (shares_to_buy * current_price)
-                    quantity += shares_to_buy
-                    entry_price = total_cost / quantity
-                    stop_loss_price = max(
-                        highest_price * (1 - dynamic_stop_loss_pct),
-                        entry_price * (1 + minimum_profit_threshold)
-                    )
-                    log_to_file(f"加碼後新止損點為: ${stop_loss_price:.2f}")
-                else:
-                    log_to_file(f"加碼失敗: {result.get('error')}", "ERROR")
-
-            log_to_file("等待下一次價格檢查...")
-            time.sleep(60)
+            log_to_file(f"等待 {delay:.0f} 秒後進行下一次價格檢查...", "DEBUG")
+            if order_filled.wait(delay):
+                order_filled.clear()
+                log_to_file("收到成交通知，提前進行價格檢查。", "DEBUG")
 
     except KeyboardInterrupt:
         log_to_file("策略被手動中止。")
+    finally:
+        order_manager.stop()
 
 
 # def send_telegram_notification(message, BOT_TOKEN, CHAT_ID, log_type="INFO"):
@@ -310,43 +177,14 @@ def live_trade_strategy(BASE_URL, headers, account_hash, finnhub_api_key, symbol
 
 def refresh_access_token_periodically(headers):
     """
-    自動每 30 分鐘刷新一次 Access Token，支持重試並增加詳細日誌。
+    以記憶體中的最新 Access Token 更新 headers。
+    Token 由 auth.TokenManager 在過期前於背景刷新，這裡不會等待網路或讀取 tokens.json。
     """
-    global access_token
-    global token_expiry
-
-    if datetime.now() >= token_expiry:
-        log_to_file("Access Token 即將過期，嘗試刷新...")
-
-        for attempt in range(3):  # 最多重試 3 次
-            try:
-                # 嘗試獲取新 Token
-                access_token = get_valid_access_token()
-                if access_token:
-                    # 更新 Headers 和 Token 過期時間
-                    headers['Authorization'] = f'Bearer {access_token}'
-                    token_expiry = datetime.now() + timedelta(minutes=30)
-
-                    # 驗證保存是否成功
-                    with open(TOKEN_FILE, "r") as f:
-                        tokens = json.load(f)
-                        if tokens.get("access_token") == access_token:
-                            log_to_file(f"Access Token 刷新成功並保存 (重試次數: {attempt + 1})。")
-                            return
-                        else:
-                            log_to_file("Access Token 刷新成功但保存到文件失敗，檢查文件操作。", "ERROR")
-                else:
-                    log_to_file(f"Access Token 刷新失敗，無法獲得新 Token。重試次數: {attempt + 1}", "ERROR")
-
-            except Exception as e:
-                # 捕獲刷新過程中的異常
-                log_to_file(f"Access Token 刷新過程中發生異常: {str(e)} (重試次數: {attempt + 1})", "ERROR")
-
-            # 重試之間增加短暫延遲
-            time.sleep(5)
-
-        # 最終失敗處理
-        log_to_file("Access Token 刷新最終失敗，程序將繼續嘗試使用現有 Token，但可能出現錯誤。", "ERROR")
+    access_token = get_valid_access_token()
+    if access_token:
+        headers['Authorization'] = f'Bearer {access_token}'
+    else:
+        log_to_file("無法取得有效的 Access Token，程序將繼續嘗試使用現有 Token，但可能出現錯誤。", "ERROR")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,160 @@
+from datetime import date, datetime, time as dtime, timedelta
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+MARKET_TZ = ZoneInfo("America/New_York")
+MARKET_OPEN = dtime(9, 30)
+MARKET_CLOSE = dtime(16, 0)
+EARLY_CLOSE = dtime(13, 0)
+
+
+def _easter(year):
+    """
+    計算西曆復活節日期 (Anonymous Gregorian algorithm)。
+    """
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _nth_weekday(year, month, weekday, n):
+    """
+    某月第 n 個星期幾 (weekday: 星期一為 0)，n 為 -1 時表示最後一個。
+    """
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year, month + 1, 1) - timedelta(days=1) if month < 12 else date(year, 12, 31)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _observed(day):
+    """
+    假日遇週六提前到週五，遇週日延後到週一。
+    """
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+@lru_cache(maxsize=None)
+def market_holidays(year):
+    """
+    返回美股 (NYSE) 指定年份的全日休市日期集合。
+    """
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),  # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),  # Presidents' Day
+        _easter(year) - timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 5, 0, -1),  # Memorial Day
+        _observed(date(year, 7, 4)),  # Independence Day
+        _nth_weekday(year, 9, 0, 1),  # Labor Day
+        _nth_weekday(year, 11, 3, 4),  # Thanksgiving
+        _observed(date(year, 12, 25)),  # Christmas
+    }
+    # 元旦遇週六時不在前一年 12/31 補休
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays.add(_observed(new_year))
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))  # Juneteenth
+    return frozenset(holidays)
+
+
+@lru_cache(maxsize=None)
+def early_close_days(year):
+    """
+    返回美股提前於 13:00 收盤的日期集合：獨立紀念日前一天、感恩節隔天及聖誕夜。
+    """
+    holidays = market_holidays(year)
+    candidates = {
+        date(year, 7, 3),
+        _nth_weekday(year, 11, 3, 4) + timedelta(days=1),
+        date(year, 12, 24),
+    }
+    return frozenset(d for d in candidates if d.weekday() < 5 and d not in holidays)
+
+
+def is_trading_day(day):
+    return day.weekday() < 5 and day not in market_holidays(day.year)
+
+
+def session_hours(day):
+    """
+    返回指定交易日的 (開盤, 收盤) 美東時間，非交易日返回 None。
+    """
+    if not is_trading_day(day):
+        return None
+    close = EARLY_CLOSE if day in early_close_days(day.year) else MARKET_CLOSE
+    return (datetime.combine(day, MARKET_OPEN, tzinfo=MARKET_TZ),
+            datetime.combine(day, close, tzinfo=MARKET_TZ))
+
+
+def _to_market_time(now):
+    if now is None:
+        return datetime.now(MARKET_TZ)
+    if now.tzinfo is None:
+        now = now.astimezone()  # 視為本機時間
+    return now.astimezone(MARKET_TZ)
+
+
+def is_market_open(now=None):
+    """
+    判斷當前是否在美股正常交易時段內。
+    :param now: 帶時區的時間，未帶時區時視為本機時間，預設為現在
+    """
+    now = _to_market_time(now)
+    hours = session_hours(now.date())
+    return hours is not None and hours[0] <= now < hours[1]
+
+
+def next_market_open(now=None):
+    """
+    返回下一次開盤時間 (美東時間)，正在交易時段內時返回本時段的開盤時間。
+    """
+    now = _to_market_time(now)
+    day = now.date()
+    while True:
+        hours = session_hours(day)
+        if hours is not None and now < hours[1]:
+            return hours[0]
+        day += timedelta(days=1)
+
+
+def seconds_until_open(now=None):
+    """
+    返回距離開盤的秒數，交易時段內返回 0。
+    """
+    now = _to_market_time(now)
+    return max((next_market_open(now) - now).total_seconds(), 0.0)
+
+
+def adaptive_poll_interval(current_price, stop_loss_price, target_add_price,
+                           min_interval=5, max_interval=60, near_pct=0.01, far_pct=0.05):
+    """
+    依價格與止損價、加碼價的距離決定下一次檢查間隔。
+    距離較近者在 near_pct 以內時使用 min_interval，超過 far_pct 時使用 max_interval，中間線性內插。
+    """
+    if not current_price:
+        return max_interval
+    distances = [abs(current_price - level) / current_price
+                 for level in (stop_loss_price, target_add_price) if level]
+    if not distances:
+        return max_interval
+    distance = min(distances)
+    if distance <= near_pct:
+        return min_interval
+    if distance >= far_pct:
+        return max_interval
+    ratio = (distance - near_pct) / (far_pct - near_pct)
+    return min_interval + ratio * (max_interval - min_interval)
@@ -0,0 +1,252 @@
+import asyncio
+import sys
+import time
+
+from account_cache import AccountSnapshotCache
+from auth import get_valid_access_token
+from trade_logger import log_to_file
+from order import get_account_hash
+from order_manager import OrderManager
+from market_schedule import is_market_open, seconds_until_open
+from price_stream import StreamingPriceFeed
+from quote_client import get_quote_client
+from symbol_monitor import SymbolMonitor
+from tick_recorder import get_tick_recorder
+from live_trading import (
+    ACCOUNT_SNAPSHOT_TTL, BASE_URL, BUY_AMOUNT, STOP_LOSS, FINNHUB_API_KEY, MARKET_HOURS_ONLY, ORDER_POLL_INTERVAL,
+    RECORD_TICKS, cooldown_seconds, refresh_access_token_periodically,
+)
+
+
+class MultiSymbolEngine:
+    """
+    在單一進程內以 asyncio 同時監控多檔股票。
+    所有股票共用同一份 Token、帳戶快照與報價客戶端；每一輪只為到期的股票查詢一次帳戶與一次批量報價，
+    每檔股票依各自 SymbolMonitor 返回的秒數排程下一次檢查；訂單成交時立即刷新帳戶並重新評估該股票。
+    """
+
+    def __init__(self, base_url, headers, account_hash, finnhub_api_key, symbols):
+        self.base_url = base_url
+        self.headers = headers
+        self.account_hash = account_hash
+        self.finnhub_api_key = finnhub_api_key
+        self.quote_client = get_quote_client(finnhub_api_key)
+        self.recorder = get_tick_recorder() if RECORD_TICKS else None
+        if self.recorder is not None:
+            self.quote_client.recorder = self.recorder
+        self.account_cache = AccountSnapshotCache(base_url, headers, ttl=ACCOUNT_SNAPSHOT_TTL)
+        self.monitors = {
+            symbol: SymbolMonitor(symbol, buy_amount=BUY_AMOUNT, stop_loss=STOP_LOSS,
+                                  cooldown_seconds=cooldown_seconds)
+            for symbol in dict.fromkeys(s.upper() for s in symbols)
+        }
+        self.next_due = {symbol: 0.0 for symbol in self.monitors}
+        self.holdings_by_symbol = {}
+        self._snapshot_dirty = True
+        self.order_manager = OrderManager(base_url, headers, account_hash, poll_interval=ORDER_POLL_INTERVAL,
+                                          on_fill=self._on_fill, on_partial_fill=self._on_fill)
+        self._loop = None
+        self._wakeup = None
+        self._ticks = None
+
+    async def wait_for_market_open(self):
+        """
+        休市期間暫停所有查詢，直到下一次開盤。返回是否有等待。
+        """
+        wait = seconds_until_open() if MARKET_HOURS_ONLY else 0
+        if wait <= 0:
+            return False
+        log_to_file(f"美股休市中，{wait / 3600:.1f} 小時後開盤，暫停監控。")
+        await asyncio.sleep(wait)
+        return True
+
+    def submit_order(self, symbol, quantity, price, action):
+        result = self.order_manager.place_order(symbol, quantity, price, action)
+        # 下單後持倉已改變，下一次評估前重新查詢帳戶
+        self.account_cache.invalidate()
+        self._snapshot_dirty = True
+        return result
+
+    def _on_fill(self, order):
+        """
+        OrderManager 背景執行緒的成交回呼，轉交給事件迴圈處理。
+        """
+        self.account_cache.invalidate()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._handle_fill, order)
+
+    def _handle_fill(self, order):
+        self._snapshot_dirty = True
+        symbol = (order.get("symbol") or "").upper()
+        if symbol in self.next_due:
+            self.next_due[symbol] = 0.0
+        if self._wakeup is not None:
+            self._wakeup.set()
+        if self._ticks is not None:
+            # 串流模式以空的成交喚醒主迴圈，讓它先刷新帳戶快照
+            self._ticks.put_nowait((None, None))
+
+    def _start_order_tracking(self):
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self.order_manager.start()
+
+    async def refresh_snapshot(self):
+        """
+        刷新共用的 Token 與帳戶快照，快照未過期時直接使用快取。報價另外批量查詢，這裡不查詢。
+        """
+        await asyncio.to_thread(refresh_access_token_periodically, self.headers)
+        cash, holdings = await asyncio.to_thread(
+            self.account_cache.get_positions_and_cash, self.finnhub_api_key, []
+        )
+        self.holdings_by_symbol = {h['symbol'].upper(): h for h in holdings}
+        self._snapshot_dirty = False
+
+    async def run(self):
+        """
+        執行監控直到所有股票都觸發止損或被手動中止。
+        """
+        log_to_file(f"開始監控股票: {', '.join(self.monitors)}")
+        self._start_order_tracking()
+        try:
+            while self.next_due:
+                if await self.wait_for_market_open():
+                    continue
+                now = time.monotonic()
+                due = [symbol for symbol, due_at in self.next_due.items() if due_at <= now]
+                if not due:
+                    # 等到最早到期的股票，或被成交通知提前喚醒
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), min(self.next_due.values()) - now)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self.run_cycle(due)
+        finally:
+            self.order_manager.stop()
+
+        log_to_file("所有股票監控皆已結束。")
+
+    async def run_cycle(self, due):
+        """
+        為到期的股票刷新一次 Token、帳戶快照與報價，再並行評估各自的策略。
+        """
+        await self.refresh_snapshot()
+        prices = await asyncio.to_thread(self.quote_client.get_quotes, due)
+
+        delays = await asyncio.gather(*(
+            asyncio.to_thread(self.monitors[symbol].step, self.holdings_by_symbol.get(symbol),
+                              prices.get(symbol), self.submit_order)
+            for symbol in due
+        ))
+
+        now = time.monotonic()
+        for symbol, delay in zip(due, delays):
+            if delay is None:
+                log_to_file(f"{symbol} 監控結束。")
+                del self.next_due[symbol]
+                del self.monitors[symbol]
+            else:
+                self.next_due[symbol] = now + delay
+
+    async def run_streaming(self, transport=None, url=None, snapshot_interval=60):
+        """
+        串流模式：訂閱成交價推送，每筆成交即時評估止損及加碼條件。
+        帳戶快照每 snapshot_interval 秒或下單後刷新一次，報價不再輪詢。
+        :param transport: 串流傳輸層，測試時可替換為本地模擬實作
+        :param url: websocket 位址，預設為 Finnhub
+        """
+        loop = asyncio.get_running_loop()
+        ticks = self._ticks = asyncio.Queue()
+
+        def on_tick(symbol, price, timestamp):
+            if self.recorder is not None:
+                self.recorder.record(symbol, price, timestamp / 1000 if timestamp else None)
+            loop.call_soon_threadsafe(ticks.put_nowait, (symbol, price))
+
+        feed = StreamingPriceFeed(self.finnhub_api_key, list(self.monitors), on_tick,
+                                  transport=transport, url=url)
+        log_to_file(f"開始以串流模式監控股票: {', '.join(self.monitors)}")
+        await self.refresh_snapshot()
+        snapshot_at = time.monotonic()
+        self._start_order_tracking()
+        feed.start()
+        try:
+            while self.monitors:
+                if await self.wait_for_market_open():
+                    # 休市期間收到的盤後成交已過時，開盤後丟棄，不當作即時價格評估
+                    stale = 0
+                    while not ticks.empty():
+                        ticks.get_nowait()
+                        stale += 1
+                    if stale:
+                        log_to_file(f"丟棄休市期間收到的 {stale} 筆成交。")
+                    continue
+                timeout = snapshot_at + snapshot_interval - time.monotonic()
+                if self._snapshot_dirty or timeout <= 0:
+                    await self.refresh_snapshot()
+                    snapshot_at = time.monotonic()
+                    continue
+                try:
+                    symbol, price = await asyncio.wait_for(ticks.get(), timeout)
+                except asyncio.TimeoutError:
+                    continue
+
+                # 合併積壓的成交，每檔股票只評估最新價格
+                latest = {symbol: price}
+                while not ticks.empty():
+                    symbol, price = ticks.get_nowait()
+                    latest[symbol] = price
+                latest.pop(None, None)
+                if self._snapshot_dirty:
+                    await self.refresh_snapshot()
+                    snapshot_at = time.monotonic()
+
+                for symbol, price in latest.items():
+                    if MARKET_HOURS_ONLY and not is_market_open():
+                        # 等待成交期間已收盤，收盤後的成交不評估，回到迴圈開頭等待下一次開盤
+                        log_to_file("已收盤，不評估收盤後收到的成交。")
+                        break
+                    monitor = self.monitors.get(symbol.upper())
+                    if monitor is None:
+                        continue
+                    alive = await asyncio.to_thread(
+                        monitor.on_tick, self.holdings_by_symbol.get(monitor.symbol), price, self.submit_order
+                    )
+                    if not alive:
+                        log_to_file(f"{monitor.symbol} 監控結束。")
+                        feed.unsubscribe(monitor.symbol)
+                        del self.monitors[monitor.symbol]
+                        del self.next_due[monitor.symbol]
+        finally:
+            feed.stop()
+            self.order_manager.stop()
+            self._ticks = None
+
+        log_to_file("所有股票監控皆已結束。")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    streaming = "--stream" in args
+    symbols = [a for a in args if a != "--stream"] or input("請輸入需要監控的股票代號 (以逗號分隔): ").replace(",", " ").split()
+    if not symbols:
+        print("未輸入任何股票代號。")
+        exit(1)
+
+    access_token = get_valid_access_token()
+    if not access_token:
+        print("錯誤: 無法獲取 Access Token。")
+        exit(1)
+    headers = {'Authorization': f'Bearer {access_token}'}
+    account_hash = get_account_hash(BASE_URL, headers)
+    if not account_hash:
+        print("錯誤: 無法獲取 Account Hash。")
+        exit(1)
+
+    engine = MultiSymbolEngine(BASE_URL, headers, account_hash, FINNHUB_API_KEY, symbols)
+    try:
+        asyncio.run(engine.run_streaming() if streaming else engine.run())
+    except KeyboardInterrupt:
+        log_to_file("策略被手動中止。")
@@ -1,7 +1,9 @@
 import requests
 import json
+import time
 from auth import get_valid_access_token
-from datetime import datetime, timedelta
+from schwab_client import get_schwab_client
+from trade_logger import log_to_file
 
 
 
@@ -9,7 +11,7 @@ def get_account_hash(base_url, headers):
     """
     查詢加密帳號值 (hashValue)
     """
-    response = requests.get(f'{base_url}/accounts/accountNumbers', headers=headers)
+    response = get_schwab_client(base_url).get('accounts/accountNumbers', headers=headers, endpoint="account_numbers")
     if response.status_code == 200:
         linked_accounts = response.json()
         print("已成功取得加密帳號：")
@@ -19,18 +21,6 @@ def get_account_hash(base_url, headers):
         print("無法取得加密帳號")
         print(response.text)
         exit(1)
-def log_to_file(message, log_type="INFO"):
-    """
-    改進的日誌記錄函數。
-    :param message: 日誌消息
-    :param log_type: 日誌類型，例如 "INFO", "ERROR", "TRADE"
-    """
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    formatted_message = f"[{timestamp}] [{log_type}] {message}"
-    with open("trade_log.txt", "a") as log_file:
-        log_file.write(formatted_message + "\n")
-    print(formatted_message)
-
 def place_order(base_url, headers, account_hash, symbol, quantity, price, action="BUY"):
     """
     通用下單功能，支持買入 (BUY) 或賣出 (SELL)。
@@ -53,14 +43,19 @@ def place_order(base_url, headers, account_hash, symbol, quantity, price, action
         ]
     }
 
-    response = requests.post(
-        f'{base_url}/accounts/{account_hash}/orders',
-        headers={**headers, "Content-Type": "application/json"},
-        json=order
-    )
+    try:
+        response = get_schwab_client(base_url).post(
+            f'accounts/{account_hash}/orders',
+            headers={**headers, "Content-Type": "application/json"},
+            json=order,
+            endpoint="place_order"
+        )
+    except requests.exceptions.RequestException as e:
+        log_to_file(f"下單請求失敗: {e}", "ERROR")
+        return {"status": "error", "error": str(e)}
 
     if response.status_code == 201:
-        log_to_file(f"下單成功: {action} {quantity} 股 {symbol} @ ${price:.2f}")
+        log_to_file(f"下單成功: {action} {quantity} 股 {symbol} @ ${price:.2f}", "TRADE")
         return {"status": "success", "order_id": response.headers.get('location', '/').split('/')[-1]}
     else:
         log_to_file(f"下單失敗: {response.text}", "ERROR")
@@ -69,12 +64,17 @@ def place_order(base_url, headers, account_hash, symbol, quantity, price, action
 
 def check_order_status(base_url, headers, account_hash, order_id):
     """
-    查詢訂單狀態
+    查詢訂單狀態，查詢失敗時返回 None
     """
-    response = requests.get(
-        f"{base_url}/accounts/{account_hash}/orders/{order_id}",
-        headers=headers
-    )
+    try:
+        response = get_schwab_client(base_url).get(
+            f"accounts/{account_hash}/orders/{order_id}",
+            headers=headers,
+            endpoint="order_status"
+        )
+    except requests.exceptions.RequestException as e:
+        print(f"查詢訂單狀態失敗: {e}")
+        return None
     if response.status_code == 200:
         order_status = response.json()
         
@@ -99,7 +99,7 @@ def check_order_status(base_url, headers, account_hash, order_id):
     else:
         print("查詢訂單狀態失敗")
         print(response.text)
-        exit(1)
+        return None
 
 def get_all_orders(base_url, headers, max_results=100, status=None, from_date=None, to_date=None, symbol=None, min_qty=None, max_qty=None):
     """
@@ -116,10 +116,11 @@ def get_all_orders(base_url, headers, max_results=100, status=None, from_date=No
     if status:
         params["status"] = status
 
-    response = requests.get(
-        f"{base_url}/orders",
+    response = get_schwab_client(base_url).get(
+        "orders",
         headers=headers,
-        params=params
+        params=params,
+        endpoint="orders"
     )
 
     if response.status_code == 200:
@@ -128,21 +129,7 @@ def get_all_orders(base_url, headers, max_results=100, status=None, from_date=No
             print("查詢條件下無符合的訂單。請嘗試調整條件。")
             return []
 
-        print("\n所有訂單：")
-        for order in orders:
-            # 進一步篩選和打印訂單
-            order_symbol = order['orderLegCollection'][0]['instrument']['symbol']
-            if symbol and order_symbol != symbol:
-                continue
-
-            print(f"訂單編號：{order.get('orderId')}")
-            print(f"狀態：{order.get('status')}")
-            print(f"股票代號：{order_symbol}")
-            print(f"數量：{order.get('quantity')}")
-            print(f"價格：{order.get('price')}")
-            print(f"進入時間：{order.get('enteredTime')}")
-            print(f"狀態描述：{order.get('statusDescription')}")
-            print("-" * 40)
+        print_orders(orders, symbol)
         return orders
     else:
         print("查詢全部訂單失敗")
@@ -150,8 +137,31 @@ def get_all_orders(base_url, headers, max_results=100, status=None, from_date=No
         return []
 
 
+def print_orders(orders, symbol=None):
+    """
+    打印訂單列表
+    """
+    print("\n所有訂單：")
+    for order in orders:
+        # 進一步篩選和打印訂單
+        order_symbol = order['orderLegCollection'][0]['instrument']['symbol']
+        if symbol and order_symbol != symbol:
+            continue
+
+        print(f"訂單編號：{order.get('orderId')}")
+        print(f"狀態：{order.get('status')}")
+        print(f"股票代號：{order_symbol}")
+        print(f"數量：{order.get('quantity')}")
+        print(f"價格：{order.get('price')}")
+        print(f"進入時間：{order.get('enteredTime')}")
+        print(f"狀態描述：{order.get('statusDescription')}")
+        print("-" * 40)
+
+
 
 if __name__ == "__main__":
+    from order_store import OrderStore
+
     # 設置基礎 URL 和取得有效的 access_token
     base_url = "https://api.schwabapi.com/trader/v1/"
     access_token = get_valid_access_token()
@@ -206,17 +216,26 @@ if __name__ == "__main__":
                 min_qty = int(min_qty) if min_qty else None
                 max_qty = int(max_qty) if max_qty else None
 
-                # 查詢訂單
-                orders = get_all_orders(
-                    base_url,
-                    headers,
+                # 先增量同步到本地訂單庫，再於本地篩選
+                store = OrderStore()
+                if store.sync(base_url, headers) is None:
+                    print("同步訂單失敗，以下為本地已保存的訂單。")
+                started = time.perf_counter()
+                orders = store.query(
                     status=status or None,
+                    symbol=symbol or None,
                     from_date=from_date or None,
                     to_date=to_date or None,
-                    symbol=symbol or None,
                     min_qty=min_qty,
                     max_qty=max_qty
                 )
+                elapsed_ms = (time.perf_counter() - started) * 1000
+                store.close()
+                if orders:
+                    print_orders(orders)
+                else:
+                    print("查詢條件下無符合的訂單。請嘗試調整條件。")
+                print(f"共 {len(orders)} 筆訂單，本地查詢耗時 {elapsed_ms:.1f} 毫秒")
             except Exception as e:
                 print(f"查詢過程中出現錯誤：{e}")
 
@@ -0,0 +1,239 @@
+import threading
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+from order import place_order
+from schwab_client import get_schwab_client
+from trade_logger import log_to_file
+
+WORKING = "WORKING"
+FILLED = "FILLED"
+CANCELED = "CANCELED"
+
+# Schwab 訂單狀態中屬於終止狀態者，除 FILLED 外都視為已取消
+FILLED_STATUSES = ("FILLED",)
+CANCELED_STATUSES = ("CANCELED", "REJECTED", "EXPIRED", "REPLACED")
+
+
+def order_state(status):
+    """
+    將 Schwab 的訂單狀態歸類為 WORKING、FILLED 或 CANCELED。
+    """
+    if status in FILLED_STATUSES:
+        return FILLED
+    if status in CANCELED_STATUSES:
+        return CANCELED
+    return WORKING
+
+
+def average_fill_price(order):
+    """
+    以成交明細計算平均成交價，沒有成交明細時返回訂單價格。
+    """
+    total_quantity = 0.0
+    total_value = 0.0
+    for activity in order.get('orderActivityCollection', []):
+        for leg in activity.get('executionLegs', []):
+            quantity = leg.get('quantity', 0.0)
+            total_quantity += quantity
+            total_value += quantity * leg.get('price', 0.0)
+    if total_quantity > 0:
+        return total_value / total_quantity
+    return order.get('price')
+
+
+class OrderManager:
+    """
+    追蹤已送出訂單的生命週期 (WORKING -> FILLED / CANCELED)。
+    背景執行緒每 poll_interval 秒以一次訂單列表查詢取得所有追蹤中訂單的狀態，
+    不再對每張訂單各發一次 GET；狀態改變時呼叫對應的回呼函數。
+    回呼函數在背景執行緒中執行，參數為追蹤中的訂單字典。
+    :param poll_interval: 有未完成訂單時的查詢間隔秒數
+    :param on_fill: 訂單全部成交時呼叫
+    :param on_cancel: 訂單被取消、拒絕或過期時呼叫
+    :param on_partial_fill: 訂單部分成交 (已成交數量增加) 時呼叫
+    :param missing_limit: 訂單連續幾次不在列表中時改為單獨查詢該訂單
+    """
+
+    def __init__(self, base_url, headers, account_hash, poll_interval=5, on_fill=None, on_cancel=None,
+                 on_partial_fill=None, missing_limit=3):
+        self.base_url = base_url
+        self.headers = headers
+        self.account_hash = account_hash
+        self.poll_interval = poll_interval
+        self.on_fill = on_fill
+        self.on_cancel = on_cancel
+        self.on_partial_fill = on_partial_fill
+        self.missing_limit = missing_limit
+
+        self.orders = {}
+        self.polls = 0
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def place_order(self, symbol, quantity, price, action="BUY"):
+        """
+        下單並開始追蹤該訂單，參數與返回值同 order.place_order，可直接作為 SymbolMonitor 的下單函數。
+        """
+        result = place_order(self.base_url, self.headers, self.account_hash, symbol, quantity, price, action=action)
+        if result.get("status") == "success" and result.get("order_id"):
+            self.track(result["order_id"], symbol, quantity, price, action)
+        return result
+
+    def track(self, order_id, symbol=None, quantity=None, price=None, action=None):
+        """
+        開始追蹤一張已送出的訂單，並喚醒背景執行緒盡快查詢。
+        """
+        with self._lock:
+            self.orders[str(order_id)] = {
+                "order_id": str(order_id),
+                "symbol": symbol,
+                "action": action,
+                "quantity": quantity,
+                "price": price,
+                "state": WORKING,
+                "status": None,
+                "filled_quantity": 0.0,
+                "fill_price": None,
+                "submitted_at": datetime.now(timezone.utc),
+                "missing": 0,
+            }
+        self._wake.set()
+
+    def get(self, order_id):
+        with self._lock:
+            order = self.orders.get(str(order_id))
+            return dict(order) if order else None
+
+    def working_orders(self):
+        with self._lock:
+            return [dict(o) for o in self.orders.values() if o["state"] == WORKING]
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="order-manager", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def poll(self):
+        """
+        以一次訂單列表查詢更新所有未完成訂單的狀態，返回本次狀態改變的訂單數。
+        """
+        with self._lock:
+            working = [o for o in self.orders.values() if o["state"] == WORKING]
+        if not working:
+            return 0
+
+        now = datetime.now(timezone.utc)
+        earliest = min(o["submitted_at"] for o in working)
+        params = {
+            "fromEnteredTime": (earliest - timedelta(minutes=5)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "toEnteredTime": (now + timedelta(minutes=5)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }
+        try:
+            response = get_schwab_client(self.base_url).get(
+                f"accounts/{self.account_hash}/orders", headers=self.headers, params=params, endpoint="orders"
+            )
+        except requests.exceptions.RequestException as e:
+            log_to_file(f"查詢訂單列表失敗: {e}", "ERROR")
+            return 0
+        self.polls += 1
+        if response.status_code != 200:
+            log_to_file(f"查詢訂單列表失敗，錯誤代碼: {response.status_code}, 錯誤信息: {response.text}", "ERROR")
+            return 0
+
+        latest = {str(o.get('orderId')): o for o in response.json()}
+        changed = 0
+        for tracked in working:
+            order = latest.get(tracked["order_id"])
+            if order is None:
+                with self._lock:
+                    tracked["missing"] += 1
+                    missing = tracked["missing"]
+                if missing < self.missing_limit:
+                    continue
+                # 不在列表中 (例如查詢時間範圍外) 時才單獨查詢這張訂單
+                order = self._fetch_order(tracked["order_id"])
+                if order is None:
+                    continue
+            with self._lock:
+                tracked["missing"] = 0
+            if self._apply(tracked, order):
+                changed += 1
+        return changed
+
+    def _fetch_order(self, order_id):
+        try:
+            response = get_schwab_client(self.base_url).get(
+                f"accounts/{self.account_hash}/orders/{order_id}", headers=self.headers, endpoint="order_status"
+            )
+        except requests.exceptions.RequestException as e:
+            log_to_file(f"查詢訂單 {order_id} 失敗: {e}", "ERROR")
+            return None
+        if response.status_code != 200:
+            log_to_file(f"查詢訂單 {order_id} 失敗，錯誤代碼: {response.status_code}", "ERROR")
+            return None
+        return response.json()
+
+    def _apply(self, tracked, order):
+        """
+        以最新的訂單資料更新追蹤狀態並觸發回呼，返回狀態是否改變。
+        """
+        status = order.get('status')
+        state = order_state(status)
+        filled_quantity = order.get('filledQuantity') or 0.0
+        with self._lock:
+            partial = state == WORKING and filled_quantity > tracked["filled_quantity"]
+            changed = state != tracked["state"] or partial
+            tracked["status"] = status
+            tracked["state"] = state
+            tracked["filled_quantity"] = filled_quantity
+            if filled_quantity:
+                tracked["fill_price"] = average_fill_price(order)
+            if tracked["symbol"] is None:
+                legs = order.get('orderLegCollection') or [{}]
+                tracked["symbol"] = legs[0].get('instrument', {}).get('symbol')
+                tracked["action"] = legs[0].get('instruction')
+            snapshot = dict(tracked)
+
+        if state == FILLED:
+            log_to_file(f"訂單 {snapshot['order_id']} 已成交: {snapshot['action']} {filled_quantity} 股 "
+                        f"{snapshot['symbol']} @ ${snapshot['fill_price'] or 0:.2f}", "TRADE")
+            self._callback(self.on_fill, snapshot)
+        elif state == CANCELED:
+            log_to_file(f"訂單 {snapshot['order_id']} 已結束，狀態: {status}，已成交 {filled_quantity} 股")
+            self._callback(self.on_cancel, snapshot)
+        elif partial:
+            log_to_file(f"訂單 {snapshot['order_id']} 部分成交: {filled_quantity}/{snapshot['quantity']} 股", "TRADE")
+            self._callback(self.on_partial_fill, snapshot)
+        return changed
+
+    def _callback(self, callback, order):
+        if callback is None:
+            return
+        try:
+            callback(order)
+        except Exception as e:
+            log_to_file(f"訂單回呼函數執行失敗: {e}", "ERROR")
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.poll()
+            except Exception as e:
+                log_to_file(f"訂單追蹤發生未預期錯誤: {e}", "ERROR")
@@ -0,0 +1,248 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+from order_manager import CANCELED_STATUSES, FILLED_STATUSES
+from schwab_client import get_schwab_client
+from trade_logger import log_to_file
+
+ORDER_DB = "orders.db"
+MAX_RESULTS = 3000  # 單次訂單查詢返回的最大筆數
+HISTORY_DAYS = 60  # API 只允許查詢 60 天內的訂單，首次同步的起點
+SYNC_WINDOW = timedelta(days=7)  # 每段同步查詢的時間範圍
+MIN_SYNC_WINDOW = timedelta(minutes=1)
+SYNC_OVERLAP = timedelta(minutes=5)  # 增量同步時往前重疊的時間，避免漏掉同一秒的訂單
+TERMINAL_STATUSES = FILLED_STATUSES + CANCELED_STATUSES
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    order_id INTEGER PRIMARY KEY,
+    account_number TEXT,
+    symbol TEXT,
+    instruction TEXT,
+    status TEXT,
+    quantity REAL,
+    filled_quantity REAL,
+    price REAL,
+    entered_time TEXT,
+    close_time TEXT,
+    raw TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_orders_symbol ON orders (symbol, entered_time);
+CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status, entered_time);
+CREATE INDEX IF NOT EXISTS idx_orders_entered_time ON orders (entered_time);
+CREATE TABLE IF NOT EXISTS sync_state (
+    scope TEXT PRIMARY KEY,
+    last_entered_time TEXT,
+    synced_at TEXT
+);
+"""
+
+
+def _format_time(value):
+    return value.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def _parse_time(value):
+    """
+    解析 Schwab 的時間字串 (例如 2024-11-20T14:30:00+0000)，返回 UTC datetime。
+    """
+    if not value:
+        return None
+    for fmt in ("%Y-%m-%dT%H:%M:%S%z", "%Y-%m-%dT%H:%M:%S.%f%z"):
+        try:
+            return datetime.strptime(value.replace("Z", "+0000"), fmt).astimezone(timezone.utc)
+        except ValueError:
+            continue
+    return None
+
+
+def _normalize_time(value):
+    """
+    將時間轉為可依字串排序的 UTC 格式，無法解析時原樣保存。
+    """
+    parsed = _parse_time(value)
+    return _format_time(parsed) if parsed else value
+
+
+class OrderStore:
+    """
+    本地 SQLite 訂單歷史。以 symbol、status、enteredTime 建立索引，
+    從最後一筆已知的 enteredTime 增量同步，大範圍依時間分段查詢，查詢篩選在本地完成。
+    :param path: 資料庫檔案路徑
+    """
+
+    def __init__(self, path=ORDER_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def upsert(self, orders):
+        """
+        寫入或更新訂單，返回寫入筆數。
+        """
+        rows = []
+        for order in orders:
+            order_id = order.get('orderId')
+            if order_id is None:
+                continue
+            leg = (order.get('orderLegCollection') or [{}])[0]
+            rows.append((
+                order_id,
+                str(order.get('accountNumber', '')),
+                leg.get('instrument', {}).get('symbol'),
+                leg.get('instruction'),
+                order.get('status'),
+                order.get('quantity'),
+                order.get('filledQuantity'),
+                order.get('price'),
+                _normalize_time(order.get('enteredTime')),
+                _normalize_time(order.get('closeTime')),
+                json.dumps(order, ensure_ascii=False),
+            ))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO orders VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+            )
+        return len(rows)
+
+    def last_entered_time(self, scope):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT last_entered_time FROM sync_state WHERE scope = ?", (scope,)
+            ).fetchone()
+        return _parse_time(row[0]) if row and row[0] else None
+
+    def earliest_open_time(self):
+        """
+        返回最早一張尚未終止訂單的 enteredTime，它的狀態仍可能改變，需要重新同步。
+        """
+        placeholders = ",".join("?" * len(TERMINAL_STATUSES))
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT MIN(entered_time) FROM orders WHERE status NOT IN ({placeholders})", TERMINAL_STATUSES
+            ).fetchone()
+        return _parse_time(row[0]) if row and row[0] else None
+
+    def sync(self, base_url, headers, account_hash=None, window=SYNC_WINDOW, max_results=MAX_RESULTS, now=None):
+        """
+        從上次同步的最後 enteredTime (或最早未終止的訂單) 開始，分段查詢到現在並寫入本地。
+        單段返回筆數達到 max_results 時表示可能被截斷，將該段對半拆分後重新查詢。
+        :param account_hash: 只同步指定帳戶，None 表示所有帳戶
+        :return: 本次寫入的訂單筆數，查詢失敗時返回 None
+        """
+        scope = account_hash or "all"
+        now = now or datetime.now(timezone.utc)
+        oldest = now - timedelta(days=HISTORY_DAYS)
+
+        start = self.last_entered_time(scope)
+        start = start - SYNC_OVERLAP if start else oldest
+        earliest_open = self.earliest_open_time()
+        if earliest_open and earliest_open < start:
+            start = earliest_open
+        start = max(start, oldest)
+
+        path = f"accounts/{account_hash}/orders" if account_hash else "orders"
+        windows = []
+        cursor = start
+        while cursor < now:
+            end = min(cursor + window, now)
+            windows.append((cursor, end))
+            cursor = end
+        windows.reverse()
+
+        written = 0
+        latest = None
+        while windows:
+            window_start, window_end = windows.pop()
+            orders = self._fetch(base_url, headers, path, window_start, window_end, max_results)
+            if orders is None:
+                return None
+            if len(orders) >= max_results and window_end - window_start > MIN_SYNC_WINDOW:
+                # 結果可能被截斷，拆成兩段依時間順序重新查詢
+                middle = window_start + (window_end - window_start) / 2
+                windows.append((middle, window_end))
+                windows.append((window_start, middle))
+                continue
+            written += self.upsert(orders)
+            for order in orders:
+                entered = _parse_time(order.get('enteredTime'))
+                if entered and (latest is None or entered > latest):
+                    latest = entered
+
+        with self._lock, self._conn:
+            previous = self._conn.execute(
+                "SELECT last_entered_time FROM sync_state WHERE scope = ?", (scope,)
+            ).fetchone()
+            if previous and previous[0] and (latest is None or previous[0] > _format_time(latest)):
+                latest = _parse_time(previous[0])
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?)",
+                (scope, _format_time(latest) if latest else None, _format_time(now)),
+            )
+        log_to_file(f"訂單同步完成，寫入 {written} 筆，範圍 {_format_time(start)} ~ {_format_time(now)}")
+        return written
+
+    def _fetch(self, base_url, headers, path, start, end, max_results):
+        params = {
+            "maxResults": max_results,
+            "fromEnteredTime": start.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            "toEnteredTime": end.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+        }
+        try:
+            response = get_schwab_client(base_url).get(path, headers=headers, params=params, endpoint="orders")
+        except requests.exceptions.RequestException as e:
+            log_to_file(f"同步訂單失敗: {e}", "ERROR")
+            return None
+        if response.status_code != 200:
+            log_to_file(f"同步訂單失敗，錯誤代碼: {response.status_code}, 錯誤信息: {response.text}", "ERROR")
+            return None
+        return response.json()
+
+    def query(self, status=None, symbol=None, from_date=None, to_date=None, min_qty=None, max_qty=None, limit=None):
+        """
+        在本地查詢訂單，依 enteredTime 由新到舊排序，返回 API 格式的訂單字典列表。
+        :param from_date: 開始日期 (yyyy-MM-dd)，包含當天
+        :param to_date: 結束日期 (yyyy-MM-dd)，包含當天
+        """
+        conditions = []
+        params = []
+        if status:
+            conditions.append("status = ?")
+            params.append(status.upper())
+        if symbol:
+            conditions.append("symbol = ?")
+            params.append(symbol.upper())
+        if from_date:
+            conditions.append("entered_time >= ?")
+            params.append(from_date)
+        if to_date:
+            next_day = datetime.strptime(to_date, "%Y-%m-%d") + timedelta(days=1)
+            conditions.append("entered_time < ?")
+            params.append(next_day.strftime("%Y-%m-%d"))
+        if min_qty is not None:
+            conditions.append("quantity >= ?")
+            params.append(min_qty)
+        if max_qty is not None:
+            conditions.append("quantity <= ?")
+            params.append(max_qty)
+
+        sql = "SELECT raw FROM orders"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY entered_time DESC"
+        if limit:
+            sql += " LIMIT ?"
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
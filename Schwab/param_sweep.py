@@ -0,0 +1,158 @@
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+from tabulate import tabulate
+
+from backtest_engine import ADD_ON_MULTIPLIER, BUY, BUY_AMOUNT, INITIAL_CASH, STOP_LOSS, run_backtest
+from backtest_metrics import compute_metrics_batch
+
+CHUNK_SIZE = 250  # 每個任務回測的參數組合數，減少進程間往返次數
+
+# 工作進程內的共享價格陣列: symbol -> ndarray (指向共享記憶體的視圖)
+_worker_prices = {}
+_worker_shm = None
+
+
+class SharedPrices:
+    """
+    將多檔股票的收盤價放進同一塊共享記憶體，工作進程只需連接並建立視圖，不必各自接收一份序列化的陣列。
+    :param prices: symbol -> 收盤價序列
+    """
+
+    def __init__(self, prices):
+        arrays = {symbol: np.ascontiguousarray(p, dtype=np.float64).ravel() for symbol, p in prices.items()}
+        total = sum(a.size for a in arrays.values())
+        self.shm = shared_memory.SharedMemory(create=True, size=max(total, 1) * 8)
+        buffer = np.ndarray((total,), dtype=np.float64, buffer=self.shm.buf)
+
+        self.layout = {}  # symbol -> (起始位置, 長度)
+        offset = 0
+        for symbol, array in arrays.items():
+            buffer[offset:offset + array.size] = array
+            self.layout[symbol] = (offset, array.size)
+            offset += array.size
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _init_worker(shm_name, layout):
+    global _worker_shm
+    _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    total = sum(length for _, length in layout.values())
+    buffer = np.ndarray((total,), dtype=np.float64, buffer=_worker_shm.buf)
+    for symbol, (offset, length) in layout.items():
+        _worker_prices[symbol] = buffer[offset:offset + length]
+
+
+def _run_chunk(symbol, combos):
+    prices = _worker_prices[symbol]
+    runs = [run_backtest(prices, *combo) for combo in combos]
+    # 整個區塊的淨值曲線一次計算指標
+    all_metrics = compute_metrics_batch(prices, [(trades, combo[0]) for (trades, _), combo in zip(runs, combos)])
+    return [
+        (symbol, *combo, int((trades['side'] == BUY).sum()), final_cash, metrics)
+        for combo, (trades, final_cash), metrics in zip(combos, runs, all_metrics)
+    ]
+
+
+def parameter_grid(initial_cash=(INITIAL_CASH,), buy_amount=(BUY_AMOUNT,), stop_loss=(STOP_LOSS,),
+                   add_on_multiplier=(ADD_ON_MULTIPLIER,)):
+    """
+    返回所有參數組合 (initial_cash, buy_amount, stop_loss, add_on_multiplier) 的列表。
+    """
+    return list(itertools.product(initial_cash, buy_amount, stop_loss, add_on_multiplier))
+
+
+def run_sweep(prices, grid, years=None, max_workers=None, chunk_size=CHUNK_SIZE):
+    """
+    以進程池對每檔股票回測所有參數組合，返回依總報酬率排序的結果列表。
+    :param prices: symbol -> 收盤價序列
+    :param grid: parameter_grid 返回的參數組合列表
+    :param years: symbol -> 回測期間年數，用於計算年化報酬率
+    :param max_workers: 進程數，預設為 CPU 核心數
+    """
+    years = years or {}
+    shared = SharedPrices(prices)
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), initializer=_init_worker,
+                                 initargs=(shared.shm.name, shared.layout)) as executor:
+            futures = [
+                executor.submit(_run_chunk, symbol, grid[start:start + chunk_size])
+                for symbol in shared.layout
+                for start in range(0, len(grid), chunk_size)
+            ]
+            rows = [row for future in futures for row in future.result()]
+    finally:
+        shared.close()
+
+    results = []
+    for symbol, initial_cash, buy_amount, stop_loss, add_on_multiplier, buys, final_cash, metrics in rows:
+        total_return = (final_cash - initial_cash) / initial_cash * 100
+        duration = years.get(symbol)
+        annualized = ((final_cash / initial_cash) ** (1 / duration) - 1) * 100 if duration else None
+        results.append({
+            "symbol": symbol,
+            "initial_cash": initial_cash,
+            "buy_amount": buy_amount,
+            "stop_loss": stop_loss,
+            "add_on_multiplier": add_on_multiplier,
+            "buys": buys,
+            "final_cash": final_cash,
+            "total_return": total_return,
+            "annualized_return": annualized,
+            "sharpe": metrics["sharpe"],
+            "max_drawdown": metrics["max_drawdown"] * 100,
+            "win_rate": metrics["win_rate"] * 100,
+            "metrics": metrics,
+        })
+    results.sort(key=lambda r: r["total_return"], reverse=True)
+    for rank, result in enumerate(results, 1):
+        result["rank"] = rank
+    return results
+
+
+def print_results(results, top=20):
+    """
+    以表格輸出排名前 top 的結果。
+    """
+    print(tabulate(
+        [[r["rank"], r["symbol"], r["initial_cash"], r["buy_amount"], r["stop_loss"], r["add_on_multiplier"],
+          r["buys"], f"${r['final_cash']:,.2f}", f"{r['total_return']:.2f}%",
+          f"{r['annualized_return']:.2f}%" if r["annualized_return"] is not None else "未知",
+          f"{r['sharpe']:.2f}", f"{r['max_drawdown']:.2f}%", f"{r['win_rate']:.1f}%"]
+         for r in results[:top]],
+        headers=["排名", "股票代號", "初始現金", "每次買入", "止損", "加碼倍數", "買入次數", "最終現金", "總報酬率",
+                 "年化報酬率", "Sharpe", "最大回撤", "勝率"],
+        tablefmt="grid"
+    ))
+
+
+if __name__ == "__main__":
+    from backTest import fetch_historical_data
+
+    symbols = sys.argv[1:] or input("請輸入回測的股票代號 (以逗號分隔): ").replace(",", " ").split()
+    prices = {}
+    years = {}
+    for symbol in symbols:
+        data = fetch_historical_data(symbol)
+        prices[symbol] = data['Close'].to_numpy()
+        years[symbol] = (data.index.max() - data.index.min()).days / 365.0
+    print("Successfully loaded historical data")
+
+    grid = parameter_grid(
+        initial_cash=(1000, 2000, 5000),
+        buy_amount=(100, 200, 300, 500),
+        stop_loss=(100, 200, 300, 400),
+        add_on_multiplier=(1.02, 1.05, 1.08, 1.10),
+    )
+    started = time.perf_counter()
+    results = run_sweep(prices, grid, years)
+    print(f"完成 {len(results)} 組回測，耗時 {time.perf_counter() - started:.2f} 秒")
+    print_results(results)
@@ -0,0 +1,146 @@
+import sys
+
+import numpy as np
+from tabulate import tabulate
+
+from backtest_engine import ADD_ON_MULTIPLIER, BUY, BUY_AMOUNT, SELL, STOP_LOSS
+
+INITIAL_CASH = 10000
+MAX_TRADES = 3  # 每檔股票單一持倉週期內的最大買入次數 (含首次買入)，同 live_trading.MAX_TRADES
+
+# 每筆交易一列：時間、股票索引、方向 (BUY/SELL)、成交價、股數、成交後共用現金
+PORTFOLIO_TRADE_DTYPE = np.dtype([
+    ('time', np.int64),
+    ('symbol_id', np.int32),
+    ('side', np.int8),
+    ('price', np.float64),
+    ('shares', np.float64),
+    ('cash', np.float64),
+])
+
+
+def merge_series(series):
+    """
+    將多檔股票的 (時間, 收盤價) 序列依時間合併為一組事件陣列。
+    同一時間的事件依股票順序排列，結果與逐檔讀取時的時間順序一致。
+    :param series: symbol -> (時間陣列, 收盤價陣列)
+    :return: (symbols, 時間, 股票索引, 價格)
+    """
+    symbols = list(series)
+    times = [np.asarray(series[s][0], dtype=np.int64) for s in symbols]
+    prices = [np.asarray(series[s][1], dtype=np.float64) for s in symbols]
+    symbol_ids = [np.full(len(t), i, dtype=np.int32) for i, t in enumerate(times)]
+
+    all_times = np.concatenate(times) if times else np.empty(0, dtype=np.int64)
+    order = np.argsort(all_times, kind='stable')  # 穩定排序保留同一時間的股票順序
+    return (symbols, all_times[order], np.concatenate(symbol_ids)[order] if times else np.empty(0, np.int32),
+            np.concatenate(prices)[order] if prices else np.empty(0))
+
+
+def run_portfolio_backtest(series, initial_cash=INITIAL_CASH, buy_amount=BUY_AMOUNT, stop_loss=STOP_LOSS,
+                           add_on_multiplier=ADD_ON_MULTIPLIER, max_trades=MAX_TRADES):
+    """
+    以共用的現金對多檔股票同時執行 backtest_strategy 的加碼/固定止損策略。
+    事件依時間順序處理，現金不足時不買入，每檔股票的單一持倉週期最多買入 max_trades 次。
+    :param series: symbol -> (時間陣列, 收盤價陣列)
+    :return: 結果字典 (symbols, trades, final_cash, open_positions)
+    """
+    symbols, times, symbol_ids, prices = merge_series(series)
+    count = len(symbols)
+    holdings = [0.0] * count
+    entry_price = [0.0] * count
+    stop_loss_price = [None] * count
+    buys = [0] * count
+    last_price = [None] * count
+    last_time = [0] * count
+
+    cash = float(initial_cash)
+    trades = []
+    append = trades.append
+
+    for t, s, current_price in zip(times.tolist(), symbol_ids.tolist(), prices.tolist()):
+        last_price[s] = current_price
+        last_time[s] = t
+        held = holdings[s]
+
+        # 初始買入條件
+        if held == 0:
+            if cash >= buy_amount:
+                cash -= buy_amount
+                held = holdings[s] = buy_amount / current_price
+                entry_price[s] = current_price
+                stop_loss_price[s] = current_price - (stop_loss / held)
+                buys[s] = 1
+                append((t, s, BUY, current_price, held, cash))
+            continue
+
+        # 止損檢查
+        stop = stop_loss_price[s]
+        if stop and current_price <= stop:
+            cash += held * current_price
+            append((t, s, SELL, current_price, held, cash))
+            held = holdings[s] = 0.0
+            stop_loss_price[s] = None
+            buys[s] = 0
+
+        # 加碼檢查
+        if cash >= buy_amount and buys[s] < max_trades and current_price >= entry_price[s] * add_on_multiplier:
+            shares = buy_amount / current_price
+            cash -= buy_amount
+            held = holdings[s] = held + shares
+            entry_price[s] = current_price
+            stop_loss_price[s] = current_price - (stop_loss / held)
+            buys[s] += 1
+            append((t, s, BUY, current_price, shares, cash))
+
+    # 最終平倉
+    open_positions = {}
+    for s in range(count):
+        if holdings[s] > 0:
+            open_positions[symbols[s]] = holdings[s]
+            cash += holdings[s] * last_price[s]
+            append((last_time[s], s, SELL, last_price[s], holdings[s], cash))
+
+    return {
+        "symbols": symbols,
+        "trades": np.array(trades, dtype=PORTFOLIO_TRADE_DTYPE),
+        "final_cash": cash,
+        "open_positions": open_positions,
+    }
+
+
+def symbol_summary(result):
+    """
+    返回每檔股票的買入次數、賣出次數及已實現損益。
+    """
+    trades = result["trades"]
+    rows = []
+    for s, symbol in enumerate(result["symbols"]):
+        own = trades[trades['symbol_id'] == s]
+        value = own['price'] * own['shares']
+        profit = float(value[own['side'] == SELL].sum() - value[own['side'] == BUY].sum())
+        rows.append([symbol, int((own['side'] == BUY).sum()), int((own['side'] == SELL).sum()), profit])
+    rows.sort(key=lambda row: row[3], reverse=True)
+    return rows
+
+
+if __name__ == "__main__":
+    from bar_store import BarStore
+
+    symbols = sys.argv[1:] or input("請輸入回測的股票代號 (以逗號分隔): ").replace(",", " ").split()
+    store = BarStore()
+    series = {}
+    for symbol in symbols:
+        bars = store.get(symbol.upper())
+        if len(bars):
+            series[symbol.upper()] = (bars['time'], bars['close'])
+
+    result = run_portfolio_backtest(series)
+    print(tabulate(
+        [[symbol, buys, sells, f"${profit:,.2f}"] for symbol, buys, sells, profit in symbol_summary(result)],
+        headers=["股票代號", "買入次數", "賣出次數", "損益"],
+        tablefmt="grid"
+    ))
+    final_cash = result["final_cash"]
+    print(f"Final cash balance: ${final_cash:.2f}")
+    print(f"總報酬率: {((final_cash - INITIAL_CASH) / INITIAL_CASH) * 100:.2f}%")
@@ -0,0 +1,133 @@
+import json
+import threading
+import time
+
+from trade_logger import log_to_file
+
+FINNHUB_WS_URL = "wss://ws.finnhub.io"
+
+
+class WebSocketTransport:
+    """
+    預設的 websocket 傳輸層，使用 websocket-client 套件。
+    任何提供 connect(url) 並返回具備 send(text)、recv()、close() 連線物件的類別都可以替換它，
+    例如連到本地的 websocket 模擬伺服器做測試。
+    """
+
+    def __init__(self, timeout=30):
+        self.timeout = timeout
+
+    def connect(self, url):
+        try:
+            import websocket
+        except ImportError:
+            raise RuntimeError("串流模式需要安裝 websocket-client：pip install websocket-client")
+        return websocket.create_connection(url, timeout=self.timeout)
+
+
+class StreamingPriceFeed:
+    """
+    Finnhub 成交價串流，於背景執行緒接收推送並對每筆成交呼叫 on_tick(symbol, price, timestamp)。
+    連線中斷時以指數退避自動重連，並重新訂閱所有股票。
+    :param api_key: Finnhub API 金鑰
+    :param symbols: 要訂閱的股票代號
+    :param on_tick: 每筆成交的回呼函數，timestamp 為毫秒
+    :param transport: 傳輸層，預設為 WebSocketTransport
+    :param url: websocket 位址，測試時可指向本地模擬伺服器
+    """
+
+    def __init__(self, api_key, symbols, on_tick, transport=None, url=None,
+                 reconnect_delay=1.0, max_reconnect_delay=30.0):
+        self.url = url or f"{FINNHUB_WS_URL}?token={api_key}"
+        self.symbols = set(symbols)
+        self.on_tick = on_tick
+        self.transport = transport or WebSocketTransport()
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self.reconnects = 0
+        self._received = False
+        self._conn = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="price-stream", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            conn = self._conn
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def subscribe(self, symbol):
+        with self._lock:
+            self.symbols.add(symbol)
+            if self._conn is not None:
+                self._send(self._conn, "subscribe", symbol)
+
+    def unsubscribe(self, symbol):
+        with self._lock:
+            self.symbols.discard(symbol)
+            if self._conn is not None:
+                self._send(self._conn, "unsubscribe", symbol)
+
+    def _run(self):
+        delay = self.reconnect_delay
+        while not self._stop.is_set():
+            self._received = False
+            try:
+                conn = self.transport.connect(self.url)
+                with self._lock:
+                    self._conn = conn
+                    for symbol in self.symbols:
+                        self._send(conn, "subscribe", symbol)
+                log_to_file(f"價格串流已連線，訂閱 {len(self.symbols)} 檔股票。")
+                self._consume(conn)
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                log_to_file(f"價格串流中斷: {e}", "ERROR")
+            finally:
+                with self._lock:
+                    conn, self._conn = self._conn, None
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+            if self._stop.is_set():
+                break
+            # 連線曾正常收到資料時重置退避時間，否則逐次加倍
+            if self._received:
+                delay = self.reconnect_delay
+            self.reconnects += 1
+            log_to_file(f"{delay:.1f} 秒後重新連線價格串流 (第 {self.reconnects} 次)...")
+            if self._stop.wait(delay):
+                break
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def _consume(self, conn):
+        while not self._stop.is_set():
+            message = conn.recv()
+            if not message:
+                raise ConnectionError("伺服器關閉連線")
+            self._received = True
+            data = json.loads(message)
+            if data.get("type") != "trade":
+                continue  # 忽略 ping 等其他訊息
+            for trade in data.get("data", []):
+                self.on_tick(trade["s"], trade["p"], trade.get("t", int(time.time() * 1000)))
+
+    @staticmethod
+    def _send(conn, action, symbol):
+        conn.send(json.dumps({"type": action, "symbol": symbol}))
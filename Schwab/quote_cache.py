@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class QuoteCache:
+    """
+    以股票代號為鍵的報價快取，支援 TTL 過期、LRU 淘汰與 single-flight 請求合併。
+    同一代號同時只會有一個請求在進行，其餘呼叫者等待並共用該次結果。
+    :param ttl: 報價有效秒數
+    :param max_size: 快取最多保存的股票數量，超過時淘汰最久未使用者
+    """
+
+    def __init__(self, ttl=5.0, max_size=256, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._clock = clock
+        self._entries = OrderedDict()  # symbol -> (price, fetched_at)
+        self._inflight = {}  # symbol -> _Flight
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.coalesced = 0
+
+    def get(self, symbol):
+        """
+        取得未過期的快取價格，沒有或已過期時返回 None。
+        """
+        with self._lock:
+            return self._lookup(symbol)
+
+    def put(self, symbol, price):
+        """
+        寫入一筆報價，None 代表查詢失敗，不寫入快取。
+        """
+        if price is None:
+            return
+        with self._lock:
+            self._store(symbol, price)
+
+    def get_or_load(self, symbol, loader):
+        """
+        取得快取價格，未命中時呼叫 loader(symbol) 查詢。
+        同一代號的並發呼叫只會觸發一次 loader。
+        """
+        with self._lock:
+            price = self._lookup(symbol)
+            if price is not None:
+                self.hits += 1
+                return price
+            flight = self._inflight.get(symbol)
+            if flight is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                self.misses += 1
+                flight = self._inflight[symbol] = _Flight()
+                leader = True
+
+        if not leader:
+            flight.done.wait()
+            return flight.price
+
+        price = None
+        try:
+            price = loader(symbol)
+        finally:
+            with self._lock:
+                if price is not None:
+                    self._store(symbol, price)
+                del self._inflight[symbol]
+            flight.price = price
+            flight.done.set()
+        return price
+
+    def invalidate(self, symbol=None):
+        """
+        清除指定代號的快取，未指定時清除全部。
+        """
+        with self._lock:
+            if symbol is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(symbol, None)
+
+    def stats(self):
+        """
+        返回命中、未命中、淘汰及合併請求的計數。
+        """
+        with self._lock:
+            total = self.hits + self.misses + self.coalesced
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "coalesced": self.coalesced,
+                "size": len(self._entries),
+                "hit_rate": (self.hits + self.coalesced) / total if total else 0.0,
+            }
+
+    def _lookup(self, symbol):
+        entry = self._entries.get(symbol)
+        if entry is None:
+            return None
+        price, fetched_at = entry
+        if self._clock() - fetched_at >= self.ttl:
+            del self._entries[symbol]
+            return None
+        self._entries.move_to_end(symbol)
+        return price
+
+    def _store(self, symbol, price):
+        self._entries[symbol] = (price, self._clock())
+        self._entries.move_to_end(symbol)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+class _Flight:
+    __slots__ = ("done", "price")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.price = None
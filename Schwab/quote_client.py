@@ -0,0 +1,112 @@
+import requests
+import time
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+
+from trade_logger import log_to_file
+from quote_cache import QuoteCache
+
+FINNHUB_QUOTE_URL = "https://finnhub.io/api/v1/quote"
+
+
+class QuoteClient:
+    """
+    Finnhub 報價客戶端，共用 keep-alive 連線池並以執行緒池並發查詢多檔股票。
+    :param api_key: Finnhub API 金鑰
+    :param max_concurrency: 同時進行中的報價請求上限
+    :param timeout: 單次請求的逾時秒數
+    :param retries: 每檔股票的最大重試次數
+    :param cache_ttl: 報價快取秒數，短時間內重複查詢同一股票直接使用快取
+    :param recorder: 記錄每筆查詢到的完整報價的 TickRecorder，None 表示不記錄
+    """
+
+    def __init__(self, api_key, max_concurrency=8, timeout=10, retries=3, retry_delay=2, cache_ttl=5.0,
+                 recorder=None):
+        self.api_key = api_key
+        self.recorder = recorder
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.max_concurrency = max_concurrency
+
+        # 連線池大小與並發上限一致，避免連線被丟棄後重新握手
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="quote")
+        self.cache = QuoteCache(ttl=cache_ttl)
+
+    def get_quote(self, symbol):
+        """
+        查詢單一股票的即時價格，優先使用快取，同一股票的並發查詢會合併為一次請求。失敗時返回 None。
+        """
+        return self.cache.get_or_load(symbol, self._fetch_quote)
+
+    def _fetch_quote(self, symbol):
+        """
+        向 Finnhub 查詢單一股票的即時價格，支持重試機制。
+        """
+        params = {"symbol": symbol, "token": self.api_key}
+        for attempt in range(self.retries):
+            try:
+                response = self.session.get(FINNHUB_QUOTE_URL, params=params, timeout=self.timeout)
+                response.raise_for_status()
+                data = response.json()
+                if self.recorder is not None:
+                    self.recorder.record_quote(symbol, data)
+                return data.get("c")  # 即時價格字段 "c"
+            except requests.exceptions.Timeout:
+                log_to_file(f"{symbol} 價格查詢第 {attempt + 1} 次超時，重試中...")
+                if attempt < self.retries - 1:
+                    time.sleep(self.retry_delay)
+                else:
+                    log_to_file(f"多次重試仍超時，無法獲取 {symbol} 的價格。", "ERROR")
+            except requests.exceptions.RequestException as e:
+                log_to_file(f"查詢 {symbol} 價格時發生錯誤: {e}")
+                if attempt < self.retries - 1:
+                    log_to_file(f"重試第 {attempt + 1} 次...")
+                    time.sleep(self.retry_delay)
+                else:
+                    log_to_file(f"多次重試失敗，無法獲取 {symbol} 的價格。", "ERROR")
+        return None
+
+    def get_quotes(self, symbols):
+        """
+        並發查詢多檔股票價格，返回 {symbol: price} 字典，查詢失敗的股票價格為 None。
+        """
+        unique_symbols = list(dict.fromkeys(s for s in symbols if s))
+        if not unique_symbols:
+            return {}
+        if len(unique_symbols) == 1:
+            # 單一股票直接在呼叫端執行緒查詢，省去排程成本
+            symbol = unique_symbols[0]
+            return {symbol: self.get_quote(symbol)}
+        prices = self._executor.map(self.get_quote, unique_symbols)
+        return dict(zip(unique_symbols, prices))
+
+    def stats(self):
+        """
+        返回報價快取的命中統計。
+        """
+        return self.cache.stats()
+
+    def close(self):
+        """
+        關閉執行緒池與連線池。
+        """
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+_clients = {}
+
+
+def get_quote_client(api_key):
+    """
+    取得指定 API 金鑰共用的 QuoteClient，同一進程內只建立一次。
+    """
+    client = _clients.get(api_key)
+    if client is None:
+        client = _clients[api_key] = QuoteClient(api_key)
+    return client
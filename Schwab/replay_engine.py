@@ -0,0 +1,221 @@
+import math
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from tabulate import tabulate
+
+from market_schedule import seconds_until_open
+from symbol_monitor import SymbolMonitor
+
+BUY_AMOUNT = 200
+STOP_LOSS = 200
+COOLDOWN_SECONDS = 60
+
+# 每筆模擬成交一列：UTC epoch 秒、方向 (1 買 / -1 賣)、股數、成交價、成交後現金
+FILL_DTYPE = np.dtype([
+    ('time', np.float64),
+    ('side', np.int8),
+    ('quantity', np.float64),
+    ('price', np.float64),
+    ('cash', np.float64),
+])
+
+
+class SimulatedClock:
+    """
+    回放用的模擬時鐘，取代 time.sleep 與 datetime.now，sleep 只推進時間不真正等待。
+    :param start: 起始時間 (UTC epoch 秒)
+    """
+
+    def __init__(self, start):
+        self.timestamp = float(start)
+
+    def time(self):
+        return self.timestamp
+
+    def now(self):
+        """
+        返回不帶時區的 UTC 時間，與 SymbolMonitor 使用的 datetime 相容。
+        """
+        return datetime(1970, 1, 1) + timedelta(seconds=self.timestamp)
+
+    def aware_now(self):
+        return datetime.fromtimestamp(self.timestamp, timezone.utc)
+
+    def sleep(self, seconds):
+        self.timestamp += seconds
+
+
+class SimulatedBroker:
+    """
+    模擬券商：以下單價格立即全數成交，維護現金與持倉，並以 get_positions_and_cash 的持倉格式返回持倉。
+    :param cash: 初始現金，None 表示不檢查現金
+    """
+
+    def __init__(self, clock, cash=None):
+        self.clock = clock
+        self.cash = cash
+        self.positions = {}  # symbol -> [股數, 平均成本]
+        self.fills = []
+        self._next_order_id = 1
+
+    def place_order(self, symbol, quantity, price, action="BUY"):
+        """
+        與 SymbolMonitor 使用的下單函數相同的介面。
+        """
+        position = self.positions.setdefault(symbol, [0.0, 0.0])
+        if action == "BUY":
+            cost = quantity * price
+            if self.cash is not None and cost > self.cash:
+                return {"status": "error", "error": f"現金不足，需要 ${cost:.2f}"}
+            total_cost = position[0] * position[1] + cost
+            position[0] += quantity
+            position[1] = total_cost / position[0]
+            if self.cash is not None:
+                self.cash -= cost
+            side = 1
+        else:
+            quantity = min(quantity, position[0])
+            position[0] -= quantity
+            if position[0] <= 0:
+                self.positions.pop(symbol)
+            if self.cash is not None:
+                self.cash += quantity * price
+            side = -1
+        self.fills.append((self.clock.time(), side, quantity, price, self.cash if self.cash is not None else math.nan))
+        order_id = self._next_order_id
+        self._next_order_id += 1
+        return {"status": "success", "order_id": str(order_id)}
+
+    def holding(self, symbol, current_price=None):
+        position = self.positions.get(symbol)
+        if not position:
+            return None
+        quantity, average_price = position
+        return {
+            "symbol": symbol,
+            "quantity": quantity,
+            "average_price": average_price,
+            "current_price": current_price,
+            "market_value": quantity * current_price if current_price else 0.0,
+            "profit_percent": (current_price - average_price) / average_price * 100 if current_price else None,
+        }
+
+    def fill_array(self):
+        return np.array(self.fills, dtype=FILL_DTYPE)
+
+
+def discard_log(message, log_type="INFO"):
+    """
+    不輸出任何內容的日誌函數，供回放使用。
+    """
+
+
+class ReplayEngine:
+    """
+    以模擬時鐘回放分鐘線或逐筆成交資料，驅動與 live_trade_strategy 相同的 SymbolMonitor 決策邏輯
+    (加碼比例、固定/移動止損切換、冷卻時間、價格未變動跳過)。
+    每次檢查取檢查時刻之前最後一筆價格，等待時間直接推進模擬時鐘，整個交易日可在一秒內回放完畢。
+    :param times: 價格時間 (UTC epoch 秒)，遞增排序
+    :param prices: 對應的成交價或收盤價
+    :param monitor: 使用的 SymbolMonitor，預設以 live_trading 的參數建立
+    :param initial_quantity: 起始持倉股數，0 表示在第一筆價格以 buy_amount 首次買入
+    :param market_hours_only: 休市期間直接跳到下一次開盤
+    :param log: 回放期間 monitor 使用的日誌函數。未指定時，自行建立的 monitor 不輸出，避免模擬交易寫入正式的
+        trade_log.txt；呼叫端傳入的 monitor 沿用它原本的日誌函數
+    """
+
+    def __init__(self, symbol, times, prices, monitor=None, cash=None, initial_quantity=0, initial_price=None,
+                 market_hours_only=True, log=None):
+        self.symbol = symbol
+        self.times = np.ascontiguousarray(times, dtype=np.float64).tolist()
+        self.prices = np.ascontiguousarray(prices, dtype=np.float64).tolist()
+        if monitor is None:
+            monitor = SymbolMonitor(symbol, buy_amount=BUY_AMOUNT, stop_loss=STOP_LOSS,
+                                    cooldown_seconds=COOLDOWN_SECONDS, log=log or discard_log)
+        elif log is not None:
+            monitor.log = log
+        self.monitor = monitor
+        self.clock = SimulatedClock(self.times[0] if self.times else 0)
+        self.broker = SimulatedBroker(self.clock, cash)
+        self.market_hours_only = market_hours_only
+        self.steps = 0
+
+        if initial_quantity:
+            self.broker.positions[symbol] = [float(initial_quantity), float(initial_price or self.prices[0])]
+        elif self.prices:
+            # 與 live_trading 選項 1 相同的首次下單
+            first_price = self.prices[0]
+            self.broker.place_order(symbol, math.ceil(self.monitor.buy_amount / first_price), first_price, "BUY")
+
+    def run(self):
+        """
+        回放到資料結束或觸發止損為止，返回 SimulatedBroker。
+        """
+        times = self.times
+        prices = self.prices
+        clock = self.clock
+        broker = self.broker
+        monitor = self.monitor
+        end = times[-1] if times else 0
+        cursor = 0
+        count = len(times)
+
+        while clock.timestamp <= end:
+            if self.market_hours_only:
+                wait = seconds_until_open(clock.aware_now())
+                if wait > 0:
+                    clock.sleep(wait)
+                    continue
+
+            # 找到檢查時刻之前最後一筆價格
+            while cursor + 1 < count and times[cursor + 1] <= clock.timestamp:
+                cursor += 1
+            current_price = prices[cursor]
+
+            self.steps += 1
+            delay = monitor.step(broker.holding(self.symbol, current_price), current_price,
+                                 broker.place_order, now=clock.now())
+            if delay is None:
+                break
+            clock.sleep(delay)
+        return broker
+
+
+def summarize(broker, symbol, last_price):
+    """
+    返回模擬交易結果：成交陣列、已實現現金流、期末持倉市值。
+    """
+    fills = broker.fill_array()
+    cash_flow = float(np.sum(np.where(fills['side'] > 0, -1, 1) * fills['quantity'] * fills['price']))
+    position = broker.positions.get(symbol)
+    market_value = position[0] * last_price if position else 0.0
+    return {"fills": fills, "cash_flow": cash_flow, "market_value": market_value,
+            "profit": cash_flow + market_value}
+
+
+if __name__ == "__main__":
+    from bar_store import BarStore
+
+    symbol = (sys.argv[1] if len(sys.argv) > 1 else input("請輸入回放的股票代號: ")).upper()
+    bars = BarStore().get(symbol, interval="1m", period="5d")
+    if len(bars) == 0:
+        print("沒有可回放的分鐘線數據。")
+        exit(1)
+
+    started = time.perf_counter()
+    engine = ReplayEngine(symbol, bars['time'], bars['close'])
+    broker = engine.run()
+    elapsed = time.perf_counter() - started
+
+    result = summarize(broker, symbol, float(bars['close'][-1]))
+    print(tabulate(
+        [[datetime.fromtimestamp(t, timezone.utc).strftime("%Y-%m-%d %H:%M:%S"), "買入" if side > 0 else "賣出",
+          quantity, f"${price:.2f}"] for t, side, quantity, price, _ in result["fills"].tolist()],
+        headers=["時間 (UTC)", "方向", "股數", "價格"],
+        tablefmt="grid"
+    ))
+    print(f"回放 {len(bars)} 根 K 線，評估 {engine.steps} 次，耗時 {elapsed:.3f} 秒")
+    print(f"損益: ${result['profit']:.2f}")
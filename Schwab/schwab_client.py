@@ -0,0 +1,152 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from trade_logger import log_to_file
+
+BASE_URL = "https://api.schwabapi.com/trader/v1/"
+
+# 各端點的請求逾時秒數 (連線, 讀取)
+ENDPOINT_TIMEOUTS = {
+    "account_numbers": (5, 10),
+    "accounts": (5, 15),
+    "orders": (5, 20),
+    "order_status": (5, 10),
+    "place_order": (5, 15),
+    "cancel_order": (5, 10),
+}
+DEFAULT_TIMEOUT = (5, 15)
+
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class TokenBucket:
+    """
+    執行緒安全的令牌桶限速器。
+    :param rate: 每秒補充的令牌數
+    :param capacity: 令牌桶容量，即允許的最大突發請求數
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1)
+        self._clock = clock
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1, timeout=None):
+        """
+        取得令牌，不足時等待補充。在 timeout 秒內無法取得時返回 False。
+        """
+        deadline = None if timeout is None else self._clock() + timeout
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return True
+                wait = (tokens - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+
+class SchwabClient:
+    """
+    Schwab Trader API 客戶端，共用 keep-alive 連線池，並提供：
+    - 依端點設定的逾時
+    - 429/5xx 及連線錯誤時的指數退避重試 (含隨機抖動)
+    - 客戶端令牌桶限速，避免超過 API 的每分鐘請求上限
+    下單 (POST) 不是冪等操作，只在伺服器明確回應 429 時重試，避免重複下單。
+    :param base_url: API 基礎網址
+    :param rate_limit: 每秒允許的請求數
+    :param burst: 允許的最大突發請求數
+    :param max_retries: 最大重試次數
+    """
+
+    def __init__(self, base_url=BASE_URL, rate_limit=2.0, burst=10, max_retries=3,
+                 backoff_base=0.5, backoff_cap=8.0, timeouts=None, pool_size=10):
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.timeouts = {**ENDPOINT_TIMEOUTS, **(timeouts or {})}
+        self.limiter = TokenBucket(rate_limit, burst)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def url(self, path):
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def request(self, method, path, headers=None, endpoint=None, timeout=None, **kwargs):
+        """
+        送出請求並返回 requests.Response。重試用盡仍發生連線錯誤或逾時時拋出 requests 的例外。
+        :param endpoint: 端點名稱，用於查詢 ENDPOINT_TIMEOUTS
+        """
+        method = method.upper()
+        timeout = timeout or self.timeouts.get(endpoint, DEFAULT_TIMEOUT)
+        idempotent = method != "POST"
+        url = self.url(path)
+
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            try:
+                response = self.session.request(method, url, headers=headers, timeout=timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if not idempotent or attempt >= self.max_retries:
+                    raise
+                delay = self._backoff(attempt)
+                log_to_file(f"{method} {path} 發生錯誤: {e}，{delay:.1f} 秒後重試 ({attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+                continue
+
+            retryable = response.status_code == 429 or (idempotent and response.status_code in RETRY_STATUS_CODES)
+            if not retryable or attempt >= self.max_retries:
+                return response
+            delay = self._retry_after(response) or self._backoff(attempt)
+            log_to_file(f"{method} {path} 回應 {response.status_code}，{delay:.1f} 秒後重試 ({attempt + 1}/{self.max_retries})")
+            time.sleep(delay)
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def _backoff(self, attempt):
+        return random.uniform(0.5, 1.0) * min(self.backoff_cap, self.backoff_base * 2 ** attempt)
+
+    def _retry_after(self, response):
+        value = response.headers.get("Retry-After")
+        try:
+            return min(float(value), self.backoff_cap) if value else None
+        except ValueError:
+            return None
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_schwab_client(base_url=BASE_URL):
+    """
+    取得指定基礎網址共用的 SchwabClient，同一進程內所有模組共用同一個連線池與限速器。
+    """
+    key = base_url.rstrip('/')
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = SchwabClient(base_url)
+        return client
@@ -0,0 +1,170 @@
+import math
+from collections import deque
+from datetime import datetime
+
+from market_schedule import adaptive_poll_interval
+from trade_logger import log_to_file
+
+# 各種情況下距離下一次檢查的秒數
+NO_DATA_DELAY = 30  # 找不到持倉或無法取得價格
+UNCHANGED_PRICE_DELAY = 5  # 價格連續未變動
+POLL_DELAY = 60  # 價格遠離止損與加碼價時的檢查間隔
+MIN_POLL_DELAY = 5  # 價格接近止損或加碼價時的檢查間隔
+
+
+class SymbolMonitor:
+    """
+    單一股票的移動止損與加碼策略狀態機。
+    不負責取價與等待，每次呼叫 step() 評估一次持倉與價格，並返回距離下一次檢查的秒數，
+    觸發止損後返回 None 表示監控結束。檢查間隔依價格與止損價、加碼價的距離在
+    min_poll_delay 與 max_poll_delay 之間調整。
+    :param log: 日誌函數 log(message, log_type)，預設寫入 trade_logger；回放或回測時可傳入不寫檔的函數
+    """
+
+    def __init__(self, symbol, buy_amount=200, stop_loss=200, add_on_pct=0.1,
+                 dynamic_stop_loss_pct=0.05, minimum_profit_threshold=0.02, cooldown_seconds=60,
+                 min_poll_delay=MIN_POLL_DELAY, max_poll_delay=POLL_DELAY, log=None):
+        self.symbol = symbol
+        self.log = log or log_to_file
+        self.buy_amount = buy_amount
+        self.stop_loss = stop_loss
+        self.add_on_pct = add_on_pct
+        self.dynamic_stop_loss_pct = dynamic_stop_loss_pct  # 動態回撤比例 (5%)
+        self.minimum_profit_threshold = minimum_profit_threshold  # 最小盈利門檻 (2%)
+        self.cooldown_seconds = cooldown_seconds
+        self.min_poll_delay = min_poll_delay
+        self.max_poll_delay = max_poll_delay
+
+        self.highest_price = 0
+        self.stop_loss_price = 0
+        self.use_moving_stop_loss = False
+        self.previous_prices = deque(maxlen=3)  # 保存最近 3 次價格
+        self.last_order_time = datetime.min
+        self.finished = False
+
+    def step(self, holding, current_price, place_order, now=None):
+        """
+        依最新持倉與價格評估止損及加碼條件。
+        :param holding: get_positions_and_cash 返回的該股票持倉字典，沒有持倉時為 None
+        :param current_price: 即時價格，無法取得時為 None
+        :param place_order: 下單函數 place_order(symbol, quantity, price, action)，返回結果字典
+        :param now: 當前時間，預設為 datetime.now()
+        :return: 距離下一次檢查的秒數，監控結束時返回 None
+        """
+        symbol = self.symbol
+        now = now or datetime.now()
+
+        if not holding:
+            self.log(f"未找到 {symbol} 的持倉數據，跳過此次檢查。")
+            return NO_DATA_DELAY
+
+        # 提取持倉數據
+        quantity = holding['quantity']
+        entry_price = holding['average_price']
+        # 設置加碼目標價格和止損條件
+        target_add_price = entry_price * (1 + self.add_on_pct)
+
+        self._update_stop_mode(quantity, entry_price, verbose=True)
+
+        if current_price is None:
+            self.log(f"無法獲取 {symbol} 的即時價格，跳過此次檢查。")
+            return NO_DATA_DELAY
+
+        # **檢查價格是否未變動 3 次**
+        self.previous_prices.append(current_price)
+        if len(set(self.previous_prices)) == 1:  # 如果最近 3 次價格相同
+            self.log(f"{symbol} 價格連續 3 次未變動，跳過此次檢查。")
+            return UNCHANGED_PRICE_DELAY
+
+        self.log(f"持倉數量: {quantity}, 平均成本: ${entry_price:.2f}")
+        self.log(f"{symbol} 當前價格: ${current_price:.2f}")
+        self.log(f"加碼目標價格: ${target_add_price:.2f}")
+
+        if not self.evaluate(quantity, entry_price, current_price, place_order, now, verbose=True):
+            return None
+        return adaptive_poll_interval(current_price, self.stop_loss_price, target_add_price,
+                                      min_interval=self.min_poll_delay, max_interval=self.max_poll_delay)
+
+    def on_tick(self, holding, current_price, place_order, now=None):
+        """
+        串流模式下對每筆成交價即時評估止損及加碼條件。
+        不做價格未變動檢查，只在止損點或持倉狀態改變時記錄日誌。
+        :return: 監控結束時返回 False
+        """
+        if self.finished:
+            return False
+        if not holding or current_price is None:
+            return True
+        quantity = holding['quantity']
+        entry_price = holding['average_price']
+        self._update_stop_mode(quantity, entry_price, verbose=False)
+        return self.evaluate(quantity, entry_price, current_price, place_order, now or datetime.now(), verbose=False)
+
+    def _update_stop_mode(self, quantity, entry_price, verbose):
+        # 判斷是否啟用移動止損
+        if quantity * entry_price > 2 * self.buy_amount:
+            self.use_moving_stop_loss = True
+            if verbose:
+                self.log(f"持倉成本超過兩次交易金額，切換至移動止損模式。", "DEBUG")
+        else:
+            self.use_moving_stop_loss = False
+            if verbose:
+                self.log(f"仍使用固定止損模式。", "DEBUG")
+
+    def evaluate(self, quantity, entry_price, current_price, place_order, now, verbose=True):
+        """
+        更新止損點並判斷止損及加碼條件，觸發止損後返回 False。
+        """
+        symbol = self.symbol
+        target_add_price = entry_price * (1 + self.add_on_pct)
+
+        # 更新移動止損
+        if self.use_moving_stop_loss:
+            if current_price > self.highest_price:
+                self.highest_price = current_price
+                self.stop_loss_price = max(
+                    self.highest_price * (1 - self.dynamic_stop_loss_pct),  # 最高價回撤比例
+                    entry_price * (1 + self.minimum_profit_threshold)  # 保證最低盈利
+                )
+                self.log(f"新高價: ${self.highest_price:.2f}，更新移動止損點: ${self.stop_loss_price:.2f}")
+            elif verbose:
+                self.log(f"當前價格未創新高，移動止損點保持為: ${self.stop_loss_price:.2f}")
+        else:
+            # 固定止損邏輯
+            self.stop_loss_price = entry_price - (self.stop_loss / quantity)
+            if verbose:
+                self.log(f"固定止損點: ${self.stop_loss_price:.2f}")
+
+        # 判斷止損條件
+        if current_price <= self.stop_loss_price:
+            self.log(f"觸發止損條件，賣出持倉: {symbol}")
+            result = place_order(symbol, quantity, current_price, "SELL")
+            if result.get("status") == "success":
+                self.log(f"止損成功，賣出 {quantity} 股 {symbol} @ ${current_price:.2f}", "TRADE")
+            else:
+                self.log(f"止損失敗: {result.get('error')}", "ERROR")
+            self.finished = True
+            return False
+
+        # **判斷加碼條件**
+        if current_price >= target_add_price and \
+                (now - self.last_order_time).total_seconds() > self.cooldown_seconds:
+            self.log(f"觸發加碼條件，嘗試買入: {symbol}")
+            shares_to_buy = math.ceil(self.buy_amount / current_price)
+            result = place_order(symbol, shares_to_buy, current_price, "BUY")
+            if result.get("status") == "success":
+                self.log(f"加碼成功，買入 {shares_to_buy} 股 {symbol} @ ${current_price:.2f}", "TRADE")
+                self.last_order_time = now
+                # 更新平均成本與止損點
+                total_cost = (quantity * entry_price) + (shares_to_buy * current_price)
+                quantity += shares_to_buy
+                entry_price = total_cost / quantity
+                self.stop_loss_price = max(
+                    self.highest_price * (1 - self.dynamic_stop_loss_pct),
+                    entry_price * (1 + self.minimum_profit_threshold)
+                )
+                self.log(f"加碼後新止損點為: ${self.stop_loss_price:.2f}")
+            else:
+                self.log(f"加碼失敗: {result.get('error')}", "ERROR")
+
+        return True
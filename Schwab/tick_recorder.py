@@ -0,0 +1,215 @@
+import atexit
+import json
+import math
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+TICK_DIR = "tick_data"
+
+# 固定寬度的報價紀錄，檔案不含標頭，可直接以 numpy.memmap 讀取
+TICK_DTYPE = np.dtype([
+    ('time', np.int64),  # 報價時間 (UTC epoch 毫秒)
+    ('recv_time', np.int64),  # 本地收到報價的時間 (UTC epoch 毫秒)
+    ('symbol_id', np.uint32),
+    ('price', np.float64),
+    ('open', np.float64),
+    ('high', np.float64),
+    ('low', np.float64),
+    ('prev_close', np.float64),
+    ('volume', np.float64),
+])
+
+_NAN = math.nan
+
+
+def tick_path(root, day):
+    """
+    返回指定日期 (UTC，date 或 yyyymmdd 字串) 的報價檔路徑。
+    紀錄依本地收到報價的日期 (recv_time) 分檔，盤後重複收到的舊報價也會寫入當天的檔案。
+    """
+    if not isinstance(day, str):
+        day = day.strftime("%Y%m%d")
+    return os.path.join(root, f"ticks-{day}.bin")
+
+
+def load_ticks(day, root=TICK_DIR):
+    """
+    以 numpy.memmap 讀取指定日期的報價紀錄，忽略寫到一半的最後一筆；沒有檔案時返回空陣列。
+    """
+    path = tick_path(root, day)
+    if not os.path.exists(path):
+        return np.empty(0, dtype=TICK_DTYPE)
+    count = os.path.getsize(path) // TICK_DTYPE.itemsize
+    if count == 0:
+        return np.empty(0, dtype=TICK_DTYPE)
+    return np.memmap(path, dtype=TICK_DTYPE, mode='r', shape=(count,))
+
+
+def load_symbol_map(root=TICK_DIR):
+    """
+    返回 {symbol: symbol_id} 對照表。
+    """
+    try:
+        with open(os.path.join(root, "symbols.json"), "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def symbol_ticks(symbol, day, root=TICK_DIR):
+    """
+    返回指定股票某一天的報價紀錄 (依紀錄順序)，可直接交給 ReplayEngine 回放。
+    """
+    symbol_id = load_symbol_map(root).get(symbol.upper())
+    ticks = load_ticks(day, root)
+    if symbol_id is None or len(ticks) == 0:
+        return np.empty(0, dtype=TICK_DTYPE)
+    return ticks[ticks['symbol_id'] == symbol_id]
+
+
+class TickRecorder:
+    """
+    將每筆觀察到的報價以固定寬度二進位紀錄附加寫入每日檔案。
+    呼叫端只把報價放進佇列，由背景執行緒批次轉成陣列後一次寫入，不會阻塞交易迴圈。
+    股票代號以 symbol_id 保存，對照表存在 symbols.json。
+    :param root: 資料目錄
+    :param flush_interval: 批次寫入的最長間隔秒數
+    :param batch_size: 每批最多寫入的紀錄數
+    """
+
+    def __init__(self, root=TICK_DIR, flush_interval=1.0, batch_size=10000):
+        self.root = root
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        os.makedirs(root, exist_ok=True)
+
+        self.symbol_ids = load_symbol_map(root)
+        self._symbols_lock = threading.Lock()
+        self._queue = queue.SimpleQueue()
+        self._closed = False
+        self.records = 0
+        self._thread = threading.Thread(target=self._run, name="tick-recorder", daemon=True)
+        self._thread.start()
+
+    def record(self, symbol, price, timestamp=None, open_price=_NAN, high=_NAN, low=_NAN, prev_close=_NAN,
+               volume=_NAN):
+        """
+        記錄一筆報價，只做入列。
+        :param timestamp: 報價時間 (epoch 秒，可含小數)，None 表示使用收到的時間
+        """
+        if price is None or self._closed:
+            return
+        now = time.time()
+        self._queue.put((
+            int((timestamp if timestamp else now) * 1000), int(now * 1000), self._symbol_id(symbol),
+            price, open_price, high, low, prev_close, volume,
+        ))
+
+    def record_quote(self, symbol, quote):
+        """
+        記錄 Finnhub /quote 回應 (c, o, h, l, pc, t 欄位)。
+        """
+        self.record(symbol, quote.get("c"), quote.get("t"), _value(quote.get("o")), _value(quote.get("h")),
+                    _value(quote.get("l")), _value(quote.get("pc")))
+
+    def flush(self, timeout=5):
+        """
+        等待目前佇列中的紀錄全部寫入檔案。
+        """
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self, timeout=5):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _symbol_id(self, symbol):
+        symbol = symbol.upper()
+        symbol_id = self.symbol_ids.get(symbol)
+        if symbol_id is not None:
+            return symbol_id
+        with self._symbols_lock:
+            symbol_id = self.symbol_ids.get(symbol)
+            if symbol_id is None:
+                symbol_ids = dict(self.symbol_ids)
+                symbol_id = symbol_ids[symbol] = len(symbol_ids)
+                path = os.path.join(self.root, "symbols.json")
+                with open(path + ".tmp", "w") as f:
+                    json.dump(symbol_ids, f)
+                os.replace(path + ".tmp", path)
+                self.symbol_ids = symbol_ids
+            return symbol_id
+
+    def _run(self):
+        running = True
+        while running:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = []
+            waiters = []
+            for item in batch:
+                if item is None:
+                    running = False
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    records.append(item)
+            if records:
+                try:
+                    self._write(records)
+                except Exception as e:
+                    print(f"寫入報價紀錄失敗: {e}")
+            for waiter in waiters:
+                waiter.set()
+
+    def _write(self, records):
+        ticks = np.array(records, dtype=TICK_DTYPE)
+        # 依收到時間分檔：休市時 Finnhub 的報價時間 t 停在最後一筆成交，不能用來決定日期
+        days = ticks['recv_time'] // 86400000
+        unique_days = np.unique(days).tolist()
+        # 絕大多數批次都在同一天，只有跨日時才拆分
+        for day in unique_days:
+            chunk = ticks if len(unique_days) == 1 else ticks[days == day]
+            date = datetime.fromtimestamp(day * 86400, timezone.utc)
+            with open(tick_path(self.root, date), "ab") as f:
+                f.write(chunk.tobytes())
+        self.records += len(ticks)
+
+
+def _value(value):
+    return _NAN if value is None else value
+
+
+_recorder = None
+_recorder_lock = threading.Lock()
+
+
+def get_tick_recorder(root=TICK_DIR):
+    """
+    取得進程共用的 TickRecorder，程式結束時自動寫完剩餘紀錄。
+    """
+    global _recorder
+    with _recorder_lock:
+        if _recorder is None:
+            _recorder = TickRecorder(root)
+            atexit.register(_recorder.close)
+        return _recorder
@@ -0,0 +1,329 @@
+import atexit
+import gzip
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from datetime import datetime
+
+LOG_FILE = "trade_log.txt"
+
+# 不受任何抑制規則影響、每次都寫入的日誌類型
+ALWAYS_WRITE_TYPES = ("ERROR", "TRADE")
+
+_NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+
+
+def message_template(message):
+    """
+    將訊息中的數字替換為 #，讓只有數值不同的訊息歸為同一類。
+    """
+    return _NUMBER_RE.sub("#", str(message))
+
+
+class LogVolumeController:
+    """
+    控制長時間執行的監控迴圈所產生的日誌量。
+    - 連續重複的相同訊息只寫一次，之後以「上一條訊息重複 N 次」彙總
+    - 同一類訊息 (數字不同視為同類) 在每個時間窗內最多寫入 rate_limit 條
+    - DEBUG 訊息每類只抽樣寫入 1/debug_sample_every 條
+    ERROR 與 TRADE 類型永遠寫入。
+    :param rate_limit: 每類訊息在 rate_window 秒內最多寫入的條數，None 表示不限制
+    :param template_limits: 指定特定訊息類別的 (條數, 秒數) 限制，鍵為 message_template 的結果
+    :param debug_sample_every: DEBUG 訊息的抽樣間隔，1 表示全部寫入
+    """
+
+    def __init__(self, rate_limit=20, rate_window=60.0, template_limits=None, debug_sample_every=10):
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.template_limits = dict(template_limits or {})
+        self.debug_sample_every = debug_sample_every
+
+        self._windows = {}  # template -> [window_start, written, suppressed]
+        self._debug_counts = {}
+        self._last_key = None
+        self._last_written = False
+        self._repeats = 0
+        self._last_created = 0.0
+
+        self.suppressed = 0
+
+    def filter(self, records):
+        """
+        過濾一批 (created, log_type, message) 紀錄，返回實際要寫入的紀錄。
+        """
+        output = []
+        for created, log_type, message in records:
+            if log_type in ALWAYS_WRITE_TYPES:
+                self._flush_repeats(output)
+                self._last_key = None
+                output.append((created, log_type, message))
+                continue
+
+            key = (log_type, message)
+            if key == self._last_key:
+                # 上一條已被抑制時，重複的訊息也一併略過，不產生彙總
+                if self._last_written:
+                    self._repeats += 1
+                    self._last_created = created
+                self.suppressed += 1
+                continue
+            self._flush_repeats(output)
+            self._last_key = key
+            self._last_written = False
+
+            template = message_template(message)
+            if log_type == "DEBUG" and self.debug_sample_every > 1:
+                count = self._debug_counts.get(template, 0)
+                self._debug_counts[template] = count + 1
+                if count % self.debug_sample_every:
+                    self.suppressed += 1
+                    continue
+
+            message = self._apply_rate_limit(template, created, message)
+            if message is None:
+                self.suppressed += 1
+                continue
+            self._last_written = True
+            output.append((created, log_type, message))
+        return output
+
+    def drain(self):
+        """
+        取出尚未寫出的重複訊息彙總。
+        """
+        output = []
+        self._flush_repeats(output)
+        self._last_key = None
+        return output
+
+    def _apply_rate_limit(self, template, created, message):
+        limit, window = self.template_limits.get(template, (self.rate_limit, self.rate_window))
+        if limit is None:
+            return message
+        state = self._windows.get(template)
+        if state is None or created - state[0] >= window:
+            suppressed = state[2] if state else 0
+            self._windows[template] = [created, 1, 0]
+            if suppressed:
+                return f"{message} (前一時段省略 {suppressed} 條同類訊息)"
+            return message
+        if state[1] < limit:
+            state[1] += 1
+            return message
+        state[2] += 1
+        return None
+
+    def _flush_repeats(self, output):
+        if self._repeats:
+            output.append((self._last_created, "INFO", f"上一條訊息重複 {self._repeats} 次"))
+            self._repeats = 0
+
+
+class TradeLogger:
+    """
+    以佇列與背景執行緒寫入的交易日誌。
+    呼叫端只把訊息放進佇列，格式化、寫檔、輸出到主控台及檔案輪替都在背景執行緒批次完成，
+    不會在交易迴圈中等待磁碟 I/O。
+    :param path: 日誌檔路徑
+    :param max_bytes: 檔案超過此大小時輪替，0 表示不依大小輪替
+    :param rotate_interval: 每隔多少秒輪替一次，None 表示不依時間輪替
+    :param backup_count: 保留的輪替檔數量
+    :param json_path: 另外輸出 JSONL 結構化日誌的路徑，None 表示不輸出
+    :param echo: 是否同時輸出到主控台
+    :param flush_interval: 批次寫入的最長間隔秒數
+    :param volume: 日誌量控制器，預設為 LogVolumeController()，傳入 False 停用
+    :param compress: 是否以 gzip 壓縮輪替後的檔案
+    """
+
+    def __init__(self, path=LOG_FILE, max_bytes=10 * 1024 * 1024, rotate_interval=None, backup_count=10,
+                 json_path=None, echo=True, flush_interval=0.5, batch_size=1000, volume=None, compress=True):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+        self.json_path = json_path
+        self.echo = echo
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.volume = LogVolumeController() if volume is None else volume
+        self.compress = compress
+
+        self._queue = queue.SimpleQueue()
+        self._file = None
+        self._json_file = None
+        self._opened_at = 0.0
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="trade-logger", daemon=True)
+        self._thread.start()
+
+    def log(self, message, log_type="INFO"):
+        """
+        記錄一條日誌，只做入列，不會阻塞。
+        """
+        self._queue.put((time.time(), log_type, message))
+
+    def flush(self, timeout=5):
+        """
+        等待目前佇列中的日誌全部寫入檔案。
+        """
+        if self._closed:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self, timeout=5):
+        """
+        寫完剩餘日誌後停止背景執行緒。
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self):
+        running = True
+        while running:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            records = []
+            waiters = []
+            for item in batch:
+                if item is None:
+                    running = False
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                else:
+                    records.append(item)
+
+            if self.volume:
+                records = self.volume.filter(records)
+                if waiters or not running:
+                    records.extend(self.volume.drain())
+            if records:
+                try:
+                    self._write(records)
+                except Exception as e:
+                    print(f"寫入日誌失敗: {e}")
+            for waiter in waiters:
+                waiter.set()
+
+        self._close_files()
+
+    def _write(self, records):
+        self._maybe_rotate()
+        lines = []
+        json_lines = []
+        for created, log_type, message in records:
+            timestamp = datetime.fromtimestamp(created).strftime("%Y-%m-%d %H:%M:%S")
+            lines.append(f"[{timestamp}] [{log_type}] {message}\n")
+            if self.json_path:
+                json_lines.append(json.dumps(
+                    {"time": created, "timestamp": timestamp, "type": log_type, "message": str(message)},
+                    ensure_ascii=False
+                ) + "\n")
+
+        text = "".join(lines)
+        self._file.write(text)
+        self._file.flush()
+        if self._json_file is not None:
+            self._json_file.write("".join(json_lines))
+            self._json_file.flush()
+        if self.echo:
+            print(text, end="")
+
+    def _maybe_rotate(self):
+        if self._file is None:
+            self._open_files()
+            return
+        too_big = self.max_bytes and self._file.tell() >= self.max_bytes
+        too_old = self.rotate_interval and time.time() - self._opened_at >= self.rotate_interval
+        if too_big or too_old:
+            self._close_files()
+            self._rotate_file(self.path)
+            if self.json_path:
+                self._rotate_file(self.json_path)
+            self._open_files()
+
+    def _rotate_file(self, path):
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return
+        target = f"{path}.{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+        counter = 1
+        while os.path.exists(target) or os.path.exists(target + ".gz"):
+            target = f"{path}.{datetime.now().strftime('%Y%m%d-%H%M%S')}-{counter}"
+            counter += 1
+        os.replace(path, target)
+        if self.compress:
+            with open(target, "rb") as src, gzip.open(target + ".gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.remove(target)
+        self._prune_backups(path)
+
+    def _prune_backups(self, path):
+        directory = os.path.dirname(os.path.abspath(path))
+        # 只比對 _rotate_file 產生的備份名稱，避免誤刪同目錄下其他檔案 (例如 trade_log.txt.jsonl)
+        pattern = re.compile(re.escape(os.path.basename(path)) + r"\.(\d{8}-\d{6})(?:-\d+)?(?:\.gz)?$")
+        backups = []
+        for name in os.listdir(directory):
+            match = pattern.match(name)
+            if match:
+                # 同一秒內的多個備份以修改時間排序
+                mtime = os.path.getmtime(os.path.join(directory, name))
+                backups.append(((match.group(1), mtime), name))
+        backups.sort()
+        for _, name in backups[:max(len(backups) - self.backup_count, 0)]:
+            os.remove(os.path.join(directory, name))
+
+    def _open_files(self):
+        self._file = open(self.path, "a", encoding="utf-8")
+        if self.json_path:
+            self._json_file = open(self.json_path, "a", encoding="utf-8")
+        self._opened_at = time.time()
+
+    def _close_files(self):
+        for f in (self._file, self._json_file):
+            if f is not None:
+                f.close()
+        self._file = None
+        self._json_file = None
+
+
+_logger = TradeLogger()
+atexit.register(lambda: _logger.close())
+
+
+def configure(**kwargs):
+    """
+    以新的設定取代預設日誌器，參數同 TradeLogger。
+    """
+    global _logger
+    _logger.close()
+    _logger = TradeLogger(**kwargs)
+    return _logger
+
+
+def get_logger():
+    return _logger
+
+
+def log_to_file(message, log_type="INFO"):
+    """
+    改進的日誌記錄函數，寫入交由背景執行緒批次完成。
+    :param message: 日誌消息
+    :param log_type: 日誌類型，例如 "INFO", "ERROR", "TRADE"
+    """
+    _logger.log(message, log_type)